@@ -7,9 +7,15 @@ import random
 import sock
 import sp_exceptions
 import handler
+import trace_buffer
 from world_model import WorldModel
 
 class Agent:
+    # how much faster than needed to reach their target we kick shots and
+    # passes.  see WorldModel.kick_to.
+    SHOT_EXTRA_POWER = 1.0
+    PASS_EXTRA_POWER = 0.2
+
     def __init__(self):
         # whether we're connected to a server yet or not
         self.__connected = False
@@ -20,6 +26,12 @@ class Agent:
         # the socket used to communicate with the server
         self.__sock = None
 
+        # writes everything we receive and send to a log, if we have one
+        self.__recorder = None
+
+        # keeps the most recent messages we received and sent, if we have one
+        self.__trace = None
+
         # models and the message handler for parsing and storing information
         self.wm = None
         self.msg_handler = None
@@ -37,11 +49,28 @@ class Agent:
         # whether we should send commands
         self.__send_commands = False
 
-    def connect(self, host, port, teamname, version=11):
+        # set when the server tells us to think in synchronous mode
+        self.__think_requested = threading.Event()
+
+        # how many times we've thought, and how long it took us in seconds
+        self.think_count = 0
+        self.think_time_total = 0.0
+        self.think_time_max = 0.0
+
+    def connect(self, host, port, teamname, version=11,
+            coalesce_commands=False, blackboard=None, recorder=None,
+            trace=None):
         """
         Gives us a connection to the server as one player on a team.  This
         immediately connects the agent to the server and starts receiving and
-        parsing the information it sends.
+        parsing the information it sends.  If 'coalesce_commands' is True, all
+        of each cycle's commands are sent to the server in a single datagram.
+        'blackboard' is a blackboard.Blackboard shared with teammates running
+        on the same host, or None to not share one.  'recorder' is a
+        match_recorder.MatchRecorder to log all our traffic with, which is
+        closed when we disconnect.  'trace' is a trace_buffer.TraceBuffer to
+        keep our latest traffic in, which is dumped to its path if one of our
+        loops dies or we disconnect.
         """
 
         # if already connected, raise an error since user may have wanted to
@@ -52,20 +81,25 @@ class Agent:
 
         # the pipe through which all of our communication takes place
         self.__sock = sock.Socket(host, port)
+        self.__recorder = recorder
+        self.__trace = trace
 
         # our models of the world and our body
-        self.wm = WorldModel(handler.ActionHandler(self.__sock))
+        self.wm = WorldModel(handler.ActionHandler(self.__sock,
+            coalesce_commands, recorder=recorder, trace=trace))
 
         # set the team name of the world model to the given name
         self.wm.teamname = teamname
 
+        self.wm.blackboard = blackboard
+
         # handles all messages received from the server
         self.msg_handler = handler.MessageHandler(self.wm)
 
         # set up our threaded message receiving system
         self.__parsing = True # tell thread that we're currently running
-        self.__msg_thread = threading.Thread(target=self.__message_loop,
-                name="message_loop")
+        self.__msg_thread = threading.Thread(target=self.__run_traced,
+                args=(self.__message_loop,), name="message_loop")
         self.__msg_thread.daemon = True # dies when parent thread dies
 
         # start processing received messages. this will catch the initial server
@@ -75,8 +109,12 @@ class Agent:
         # send the init message and allow the message handler to handle further
         # responses.
         init_address = self.__sock.address
-        init_msg = "(init %s (version %d))"
-        self.__sock.send(init_msg % (teamname, version))
+        init_msg = "(init %s (version %d))" % (teamname, version)
+        self.__sock.send(init_msg)
+
+        # logged so readers of the log know which team we played for
+        if recorder is not None:
+            recorder.record_sent(init_msg + "\0")
 
         # wait until the socket receives a response from the server and gets its
         # assigned port.
@@ -86,8 +124,8 @@ class Agent:
         # create our thinking thread.  this will perform the actions necessary
         # to play a game of robo-soccer.
         self.__thinking = False
-        self.__think_thread = threading.Thread(target=self.__think_loop,
-                name="think_loop")
+        self.__think_thread = threading.Thread(target=self.__run_traced,
+                args=(self.__think_loop,), name="think_loop")
         self.__think_thread.daemon = True
 
         # set connected state.  done last to prevent state inconsistency if
@@ -154,10 +192,41 @@ class Agent:
         if self.__think_thread.is_alive():
             self.__think_thread.join(0.01)
 
+        if self.__recorder is not None:
+            self.__recorder.close()
+
+        self.dump_trace()
+
         # reset all standard variables in this object.  self.__connected gets
         # reset here, along with all other non-user defined internal variables.
         Agent.__init__(self)
 
+    def dump_trace(self, path=None):
+        """
+        Writes the latest traffic in our trace to the given path, or the
+        trace's own path if none is given, without waiting for it to finish.
+        Returns the thread doing the writing, or None if we have no trace or
+        nowhere to write it.
+        """
+
+        trace = self.__trace
+        if trace is None or (path is None and trace.path is None):
+            return None
+
+        return trace.dump_async(path)
+
+    def __run_traced(self, loop):
+        """
+        Runs one of our loops, dumping our trace if it dies so we can see what
+        led up to it.
+        """
+
+        try:
+            loop()
+        except:
+            self.dump_trace()
+            raise
+
     def __message_loop(self):
         """
         Handles messages received from the server.
@@ -172,8 +241,27 @@ class Agent:
             # world model as-is.  the world model parses it and stores it within
             # itself for perusal at our leisure.
             raw_msg = self.__sock.recv()
+
+            if self.__trace is not None:
+                self.__trace.record(trace_buffer.RECEIVED, raw_msg)
+
+            if self.__recorder is not None:
+                self.__recorder.record_received(raw_msg)
+
             msg_type = self.msg_handler.handle_message(raw_msg)
 
+            # in synchronous mode the server waits for everybody to say they're
+            # done before moving on, so we think exactly once each time it asks.
+            # if we're not playing yet we have nothing to do, so say so at once
+            # to avoid holding up the game.
+            if msg_type == handler.MessageHandler.THINK:
+                if self.__thinking:
+                    self.__think_requested.set()
+                else:
+                    self.wm.ah.send_done()
+
+                continue
+
             # we send commands all at once every cycle, ie. whenever a
             # 'sense_body' command is received
             if msg_type == handler.ActionHandler.CommandType.SENSE_BODY:
@@ -192,6 +280,18 @@ class Agent:
         """
 
         while self.__thinking:
+            # in synchronous mode we think only when the server asks us to,
+            # then send our commands and tell it we're done right away.
+            if self.wm.server_parameters.synch_mode:
+                if self.__think_requested.wait(0.1):
+                    self.__think_requested.clear()
+
+                    self.__timed_think()
+                    self.wm.ah.send_commands()
+                    self.wm.ah.send_done()
+
+                continue
+
             # tell the ActionHandler to send its enqueued messages if it is time
             if self.__send_commands:
                 self.__send_commands = False
@@ -206,11 +306,52 @@ class Agent:
                 self.__should_think_on_data = False
 
                 # performs the actions necessary for the agent to play soccer
-                self.think()
+                self.__timed_think()
             else:
                 # prevent from burning up all the cpu time while waiting for data
                 time.sleep(0.0001)
 
+    def __timed_think(self):
+        """
+        Calls the think method, keeping track of how long it takes.  What we
+        know is published to the team's blackboard first, if we have one, so
+        teammates get it as soon as possible.
+        """
+
+        start = time.time()
+        self.wm.publish_to_blackboard()
+        self.think()
+        elapsed = time.time() - start
+
+        self.think_count += 1
+        self.think_time_total += elapsed
+        self.think_time_max = max(self.think_time_max, elapsed)
+
+    def get_stats(self):
+        """
+        Returns a dict of statistics about the game so far and how long the
+        agent spent thinking, suitable for collecting into reports.
+        """
+
+        stats = {
+            "think_count": self.think_count,
+            "think_time_total": self.think_time_total,
+            "think_time_max": self.think_time_max,
+        }
+
+        if self.wm is not None:
+            stats["side"] = self.wm.side
+            stats["uniform_number"] = self.wm.uniform_number
+            stats["score_l"] = self.wm.score_l
+            stats["score_r"] = self.wm.score_r
+            stats["play_mode"] = self.wm.play_mode
+            stats["sim_time"] = self.wm.sim_time
+            stats["bytes_sent"] = self.wm.ah.bytes_sent
+            stats["datagrams_sent"] = self.wm.ah.datagrams_sent
+            stats["overwritten_primaries"] = self.wm.ah.overwritten_primaries
+
+        return stats
+
     def setup_environment(self):
         """
         Called before the think loop starts, this allows the user to store any
@@ -265,6 +406,12 @@ class Agent:
 
             return
 
+        # tell our teammates where the ball is.  they can only hear one of us a
+        # cycle, so we take turns.
+        if (self.wm.sim_time is not None and
+                self.wm.sim_time % 11 == self.wm.uniform_number - 1):
+            self.wm.say_ball_state()
+
         # determine the enemy goal position
         goal_pos = None
         if self.wm.side == WorldModel.SIDE_R:
@@ -296,17 +443,44 @@ class Agent:
 
         # attack!
         else:
-            # find the ball
+            # find the ball, unless a teammate told us where it's going
             if self.wm.ball is None or self.wm.ball.direction is None:
+                intercept = self.wm.get_ball_intercept()
+                if (intercept is not None and
+                        self.wm.dash_to_point(intercept.point, 65)):
+                    return
+
                 self.wm.ah.turn(30)
 
                 return
 
-            # kick it at the enemy goal
+            # kick it at the enemy goal, or to a teammate if that looks better
             if self.wm.is_ball_kickable():
-                self.wm.kick_to(goal_pos, 1.0)
+                # shots go as hard as they can, but passes only need to get
+                # there with a little pace left so the receiver can control
+                # the ball.
+                options = self.wm.evaluate_passes([goal_pos],
+                        Agent.SHOT_EXTRA_POWER)
+                options.extend(self.wm.evaluate_passes(
+                    self.wm.get_visible_teammates(), Agent.PASS_EXTRA_POWER))
+                options.sort(key=lambda o: o.score, reverse=True)
+
+                target = goal_pos
+                extra_power = Agent.SHOT_EXTRA_POWER
+                if len(options) > 0:
+                    target = options[0].target
+                    if options[0].receiver is not None:
+                        extra_power = Agent.PASS_EXTRA_POWER
+
+                self.wm.kick_to(target, extra_power)
                 return
             else:
+                # run to where we can first get to the ball, if we know
+                intercept = self.wm.get_ball_intercept()
+                if (intercept is not None and
+                        self.wm.dash_to_point(intercept.point, 65)):
+                    return
+
                 # move towards ball
                 if -7 <= self.wm.ball.direction <= 7:
                     self.wm.ah.dash(65)
@@ -321,18 +495,39 @@ if __name__ == "__main__":
     import sys
     import multiprocessing as mp
 
+    import blackboard
+
+    # share a blackboard between all our agents if asked to
+    use_blackboard = "--blackboard" in sys.argv
+    if use_blackboard:
+        sys.argv.remove("--blackboard")
+
     # enforce corrent number of arguments, print help otherwise
     if len(sys.argv) < 3:
-        print "args: ./agent.py <team_name> <num_players>"
+        print ("args: ./agent.py <team_name> <num_players> [host] [port] "
+               "[--blackboard]")
         sys.exit()
 
-    def spawn_agent(team_name):
+    # where the server is, defaulting to a local one on the standard port
+    host = "localhost"
+    port = 6000
+    if len(sys.argv) > 3:
+        host = sys.argv[3]
+    if len(sys.argv) > 4:
+        port = int(sys.argv[4])
+
+    # created before the agents so every one of their processes shares it
+    team_blackboard = None
+    if use_blackboard:
+        team_blackboard = blackboard.Blackboard()
+
+    def spawn_agent(team_name, team_blackboard):
         """
         Used to run an agent in a seperate physical process.
         """
 
         a = Agent()
-        a.connect("localhost", 6000, team_name)
+        a.connect(host, port, team_name, blackboard=team_blackboard)
         a.play()
 
         # we wait until we're killed
@@ -345,7 +540,8 @@ if __name__ == "__main__":
     for agent in xrange(min(11, int(sys.argv[2]))):
         print "  Spawning agent %d..." % agent
 
-        at = mp.Process(target=spawn_agent, args=(sys.argv[1],))
+        at = mp.Process(target=spawn_agent,
+                args=(sys.argv[1], team_blackboard))
         at.daemon = True
         at.start()
 
@@ -0,0 +1,128 @@
+import math
+
+def velocity_from_changes(distance, direction, dist_change, dir_change,
+        abs_neck_dir, self_velocity=(0.0, 0.0)):
+    """
+    Estimates the absolute velocity of a seen object from the distance and
+    direction deltas the server reports for it.  'direction' and 'dir_change'
+    are relative to our neck in degrees, increasing clockwise, while the
+    returned (vx, vy) velocity uses absolute directions that increase
+    counter-clockwise.  The deltas are relative to our own motion, so our own
+    absolute velocity is added back in.
+    """
+
+    # unit vectors along and across the line of sight to the object
+    theta = math.radians(abs_neck_dir - direction)
+    cos_t = math.cos(theta)
+    sin_t = math.sin(theta)
+
+    # the sideways speed comes from the change in angle at this distance.  a
+    # clockwise change in relative direction is a counter-clockwise change in
+    # absolute direction, hence the negation.
+    radial = dist_change
+    tangential = -math.radians(dir_change) * distance
+
+    vx = radial * cos_t - tangential * sin_t + self_velocity[0]
+    vy = radial * sin_t + tangential * cos_t + self_velocity[1]
+
+    return (vx, vy)
+
+def predict_position(position, velocity, cycles, decay):
+    """
+    Returns where a ball at 'position' moving with 'velocity' will be after the
+    given number of cycles, using the closed-form sum of the geometric series of
+    its decaying speed.
+    """
+
+    travel = (1 - decay ** cycles) / (1 - decay)
+    return (position[0] + velocity[0] * travel,
+            position[1] + velocity[1] * travel)
+
+def ball_travel(decay, horizon):
+    """
+    Returns a list of how far a ball goes in each number of cycles from 0 to
+    'horizon', per unit of its initial speed, ie. the partial sums of the
+    geometric series of its decay.
+    """
+
+    travel = [0.0]
+    step = 1.0
+    for i in xrange(horizon):
+        travel.append(travel[-1] + step)
+        step *= decay
+
+    return travel
+
+def predict_trajectory(position, velocity, decay, horizon, travel=None):
+    """
+    Returns a list of the ball's predicted positions for every cycle from now
+    (index 0) up to and including 'horizon' cycles into the future.  'travel'
+    is a table from ball_travel for the same decay, which is built if it's
+    missing or doesn't go far enough.
+    """
+
+    if travel is None or len(travel) <= horizon:
+        travel = ball_travel(decay, horizon)
+
+    x, y = position
+    vx, vy = velocity
+
+    trajectory = []
+    for i in xrange(horizon + 1):
+        t = travel[i]
+        trajectory.append((x + vx * t, y + vy * t))
+
+    return trajectory
+
+def reach_table(speed_max, accel_max, decay, horizon):
+    """
+    Returns a list of the furthest distance a player starting at rest can cover
+    in each number of cycles from 0 to 'horizon', accelerating as hard as it
+    can in a straight line.
+    """
+
+    reach = [0.0]
+    speed = 0.0
+    dist = 0.0
+    for i in xrange(horizon):
+        # each cycle the player accelerates, moves, and then slows down
+        speed = min(speed + accel_max, speed_max)
+        dist += speed
+        speed *= decay
+
+        reach.append(dist)
+
+    return reach
+
+def solve_intercepts(trajectory, candidates, reach, margin):
+    """
+    Finds the earliest cycle at which each candidate can get within 'margin' of
+    the ball following 'trajectory'.  'candidates' is a list of (x, y)
+    positions and 'reach' the distance table from reach_table, which must be at
+    least as long as the trajectory.  Returns a list with the intercept cycle
+    for each candidate, or None for those that can't make it in time.
+
+    All candidates are evaluated together as we step forward along the
+    trajectory, so each predicted ball position is only visited once.
+    """
+
+    cycles = [None] * len(candidates)
+    remaining = range(len(candidates))
+
+    for t, (bx, by) in enumerate(trajectory):
+        if len(remaining) == 0:
+            break
+
+        limit = reach[t] + margin
+
+        still_remaining = []
+        for i in remaining:
+            x, y = candidates[i]
+            if (bx - x) ** 2 + (by - y) ** 2 <= limit * limit:
+                cycles[i] = t
+            else:
+                still_remaining.append(i)
+
+        remaining = still_remaining
+
+    return cycles
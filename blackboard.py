@@ -0,0 +1,135 @@
+import collections
+import multiprocessing
+
+# what a teammate last published about itself and the ball.  'ball_position'
+# and 'ball_velocity' are None if it couldn't place the ball.
+BlackboardEntry = collections.namedtuple("BlackboardEntry",
+        "slot cycle position ball_cycle ball_position ball_velocity")
+
+class Blackboard:
+    """
+    A fixed-layout array of doubles in shared memory that agents of a team
+    running on the same host use to tell each other where they are and where
+    they see the ball.  Each agent writes only to its own slot and reads the
+    others', so no locks are needed.
+
+    Every slot is guarded by a sequence number that's odd while the slot is
+    being written.  Readers retry if the sequence number is odd or changes
+    while they copy the slot, so they never see half of an update.
+
+    The blackboard must be created before the agent processes are started,
+    and handed to each of them.
+    """
+
+    # offsets of each value within a slot
+    SEQ = 0
+    CYCLE = 1
+    X = 2
+    Y = 3
+    BALL_CYCLE = 4
+    BALL_X = 5
+    BALL_Y = 6
+    BALL_VX = 7
+    BALL_VY = 8
+    SLOT_SIZE = 9
+
+    # how many times a reader retries a slot that's being written
+    READ_ATTEMPTS = 16
+
+    def __init__(self, num_slots=11):
+        """
+        Creates a blackboard with a slot for each of 'num_slots' players, with
+        nothing published in any of them.
+        """
+
+        self.num_slots = num_slots
+        self.values = multiprocessing.RawArray('d',
+                num_slots * Blackboard.SLOT_SIZE)
+
+        for slot in xrange(num_slots):
+            base = slot * Blackboard.SLOT_SIZE
+            self.values[base + Blackboard.CYCLE] = -1
+            self.values[base + Blackboard.BALL_CYCLE] = -1
+
+    def publish(self, slot, cycle, position, ball_state=None):
+        """
+        Writes our (x, y) position as of the given cycle into our slot, along
+        with the ball's ((x, y), (vx, vy)) state if we know it.  Only one agent
+        may ever publish to a slot.
+        """
+
+        values = self.values
+        base = slot * Blackboard.SLOT_SIZE
+        seq = values[base + Blackboard.SEQ]
+
+        # an odd sequence number tells readers we're in the middle of writing
+        values[base + Blackboard.SEQ] = seq + 1
+
+        values[base + Blackboard.CYCLE] = cycle
+        values[base + Blackboard.X] = position[0]
+        values[base + Blackboard.Y] = position[1]
+
+        if ball_state is not None:
+            (bx, by), (bvx, bvy) = ball_state
+            values[base + Blackboard.BALL_CYCLE] = cycle
+            values[base + Blackboard.BALL_X] = bx
+            values[base + Blackboard.BALL_Y] = by
+            values[base + Blackboard.BALL_VX] = bvx
+            values[base + Blackboard.BALL_VY] = bvy
+
+        values[base + Blackboard.SEQ] = seq + 2
+
+    def read(self, slot):
+        """
+        Returns a consistent BlackboardEntry for a slot, or None if nothing was
+        ever published to it or it's being written too often to read.
+        """
+
+        values = self.values
+        base = slot * Blackboard.SLOT_SIZE
+        end = base + Blackboard.SLOT_SIZE
+
+        for i in xrange(Blackboard.READ_ATTEMPTS):
+            seq = values[base + Blackboard.SEQ]
+            if seq % 2 == 1:
+                continue
+
+            copy = values[base:end]
+            if values[base + Blackboard.SEQ] != seq:
+                continue
+
+            cycle = int(copy[Blackboard.CYCLE])
+            if cycle < 0:
+                return None
+
+            ball_cycle = int(copy[Blackboard.BALL_CYCLE])
+            ball_position = None
+            ball_velocity = None
+            if ball_cycle >= 0:
+                ball_position = (copy[Blackboard.BALL_X],
+                                 copy[Blackboard.BALL_Y])
+                ball_velocity = (copy[Blackboard.BALL_VX],
+                                 copy[Blackboard.BALL_VY])
+
+            return BlackboardEntry(slot, cycle,
+                    (copy[Blackboard.X], copy[Blackboard.Y]), ball_cycle,
+                    ball_position, ball_velocity)
+
+        return None
+
+    def read_all(self, exclude=None):
+        """
+        Returns the entries of every slot that has been published to, except
+        for the slot given in 'exclude'.
+        """
+
+        entries = []
+        for slot in xrange(self.num_slots):
+            if slot == exclude:
+                continue
+
+            entry = self.read(slot)
+            if entry is not None:
+                entries.append(entry)
+
+        return entries
@@ -0,0 +1,101 @@
+from world_model import ServerParameters
+
+class CommandEncoder:
+    """
+    Builds the text of commands for the server from templates made once for a
+    fixed number of decimal places, clamping each value to the limits the
+    server allows as it goes.  The server doesn't act on more precision than a
+    couple of decimal places, so sending more only costs formatting time and
+    bytes.
+    """
+
+    # sent by itself to say we're done with a cycle in synchronous mode
+    DONE = "(done)"
+
+    def __init__(self, server_parameters=None, precision=2):
+        """
+        server_parameters: the ServerParameters to take limits from.  these are
+            read every time a command is encoded, so later changes to them are
+            respected.  the defaults are used if none are given.
+        precision: the number of decimal places to send values with.
+        """
+
+        if server_parameters is None:
+            server_parameters = ServerParameters()
+
+        self.server_parameters = server_parameters
+        self.set_precision(precision)
+
+    def set_precision(self, precision):
+        """
+        Rebuilds the command templates to send values with the given number of
+        decimal places.
+        """
+
+        self.precision = precision
+
+        f = "%%.%df" % precision
+        self.move_template = "(move %s %s)" % (f, f)
+        self.turn_template = "(turn %s)" % f
+        self.dash_template = "(dash %s)" % f
+        self.kick_template = "(kick %s %s)" % (f, f)
+        self.catch_template = "(catch %s)" % f
+        self.turn_neck_template = "(turn_neck %s)" % f
+
+    def move(self, x, y):
+        """
+        Returns a command to teleport to the given point.
+        """
+
+        return self.move_template % (x, y)
+
+    def turn(self, moment):
+        """
+        Returns a command to turn the body by the given moment in degrees.
+        """
+
+        sp = self.server_parameters
+        return self.turn_template % min(max(moment, sp.minmoment), sp.maxmoment)
+
+    def dash(self, power):
+        """
+        Returns a command to dash with the given power.
+        """
+
+        sp = self.server_parameters
+        return self.dash_template % min(max(power, sp.minpower), sp.maxpower)
+
+    def kick(self, power, direction):
+        """
+        Returns a command to kick with the given power in the given direction
+        relative to the body.
+        """
+
+        sp = self.server_parameters
+        return self.kick_template % (min(max(power, sp.minpower), sp.maxpower),
+                min(max(direction, sp.minmoment), sp.maxmoment))
+
+    def catch(self, direction):
+        """
+        Returns a command to catch in the given direction relative to the body.
+        """
+
+        sp = self.server_parameters
+        return self.catch_template % min(max(direction, sp.minmoment),
+                sp.maxmoment)
+
+    def say(self, message):
+        """
+        Returns a command to say the given message.
+        """
+
+        return "(say %s)" % message
+
+    def turn_neck(self, moment):
+        """
+        Returns a command to turn the neck by the given moment in degrees.
+        """
+
+        sp = self.server_parameters
+        return self.turn_neck_template % min(max(moment, sp.minneckmoment),
+                sp.maxneckmoment)
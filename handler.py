@@ -1,17 +1,13 @@
 import collections
-import Queue as queue
 
+import command_encoder
 import message_parser
+import say_codec
 import sp_exceptions
 import game_object
+import trace_buffer
 from world_model import WorldModel
 
-# should we print messages received from the server?
-PRINT_SERVER_MESSAGES = False
-
-# should we print commands sent to the server?
-PRINT_SENT_COMMANDS = False
-
 class MessageHandler:
     """
     Handles all incoming messages from the server.  Parses their data and puts
@@ -25,6 +21,9 @@ class MessageHandler:
     # an inner class used for creating named tuple 'hear' messages
     Message = collections.namedtuple("Message", "time sender message")
 
+    # the message the server sends in synchronous mode when it's time to think
+    THINK = "think"
+
     def __init__(self, world_model):
         self.wm = world_model
 
@@ -36,10 +35,14 @@ class MessageHandler:
         """
 
         # get all the expressions contained in the given message
-        parsed = message_parser.parse(msg)
+        return self.handle_parsed(message_parser.parse(msg))
 
-        if PRINT_SERVER_MESSAGES:
-            print parsed[0] + ":", parsed[1:], "\n"
+    def handle_parsed(self, parsed):
+        """
+        Stores the data of a message that has already been parsed by
+        message_parser.parse in the world model.  Returns the type of message
+        received.
+        """
 
         # this is the name of the function that should be used to handle
         # this message type.  we pull it from this object dynamically to
@@ -70,9 +73,13 @@ class MessageHandler:
         """
 
         # the simulation cycle of the soccer server
-        # TODO: we should probably use this somewhere...
         sim_time = msg[1]
 
+        # when the server sends us the full state of the world there's nothing
+        # to gain from working it out again from what we can see.
+        if self.wm.fullstate_time is not None:
+            return
+
         # store new values before changing those in the world model.  all new
         # values replace those in the world model at the end of parsing.
         new_ball = None
@@ -119,14 +126,9 @@ class MessageHandler:
 
             # parse flags
             if name[0] == 'f':
-                # since the flag's name sometimes contains a number, the parser
-                # recognizes it as such and converts it into an int.  it's
-                # always the last item when it's a number, so we stringify the
-                # last item of the name to convert any numbers back.
-                name[-1] = str(name[-1])
-
-                # the flag's id is its name's members following the f as a string
-                flag_id = ''.join(name[1:])
+                # the flag's id is its index in the landmark table, looked up
+                # straight from its name.
+                flag_id = self.wm.landmarks.index.get(tuple(name))
 
                 new_flags.append(game_object.Flag(distance, direction, flag_id))
 
@@ -156,9 +158,9 @@ class MessageHandler:
                         else:
                             side = WorldModel.SIDE_L
 
-                # calculate player's speed
+                # the player's speed is filled in by the world model once it
+                # knows where the player is.
                 speed = None
-                # TODO: calculate player's speed!
 
                 new_players.append(game_object.Player(distance, direction,
                     dist_change, dir_change, speed, teamname, side,
@@ -184,7 +186,7 @@ class MessageHandler:
 
             # parse the ball
             elif name[0] == 'b':
-                # TODO: handle speed!
+                # speed is filled in by the world model, as for players
                 new_ball = game_object.Ball(distance, direction, dist_change,
                         dir_change, None)
 
@@ -214,7 +216,66 @@ class MessageHandler:
         # tell the WorldModel to update any internal variables based on the
         # newly gleaned information.
         self.wm.process_new_info(new_ball, new_flags, new_goals, new_players,
-                new_lines)
+                new_lines, sim_time)
+
+    def _handle_fullstate(self, msg):
+        """
+        Parses the full state of the world, sent to us by the server when
+        fullstate is on for our side, and gives it to the world model as-is.
+
+        Positions, velocities, and directions are converted from the server's
+        coordinates, where the y-axis points at the bottom of the field and
+        angles increase clockwise, to ours.
+        """
+
+        sim_time = msg[1]
+
+        ball = None
+        players = []
+        for info in msg[2:]:
+            name = info[0]
+
+            # objects come as a list of their name followed by their state
+            if isinstance(name, list):
+                # only the leading numbers are the state, anything after them
+                # (stamina, tackle or card markers, ...) is left out.
+                values = []
+                for v in info[1:]:
+                    if isinstance(v, list) or isinstance(v, str):
+                        break
+                    values.append(v)
+
+                if name[0] == 'b' and len(values) >= 4:
+                    x, y, vx, vy = values[:4]
+                    ball = (x, -y, vx, -vy)
+
+                elif name[0] == 'p' and len(values) >= 6:
+                    side = name[1]
+                    uniform_number = name[2]
+                    x, y, vx, vy, body_dir, neck_dir = values[:6]
+                    players.append((side, uniform_number, x, -y, vx, -vy,
+                        -body_dir, neck_dir))
+
+            # everything else is information about the game and our body
+            elif name == "pmode":
+                self.wm.play_mode = info[1]
+            elif name == "vmode":
+                self.wm.view_quality = info[1]
+                self.wm.view_width = info[2]
+            elif name == "stamina":
+                self.wm.stamina = info[1]
+                self.wm.effort = info[2]
+            elif name == "score":
+                self.wm.score_l = info[1]
+                self.wm.score_r = info[2]
+
+        self.wm.process_fullstate(sim_time, ball, players)
+
+    def _handle_think(self, msg):
+        """
+        Handles the server's request to think in synchronous mode.  There's
+        nothing to store, since the agent responds to these itself.
+        """
 
     def _handle_hear(self, msg):
         """
@@ -223,7 +284,7 @@ class MessageHandler:
 
         time_recvd = msg[1] # server cycle when message was heard
         sender = msg[2] # name (or direction) of who sent the message
-        message = msg[3] # message string
+        message = msg[-1] # message string, after any sender details
 
         # ignore messages sent by self (NOTE: would anybody really want these?)
         if sender == "self":
@@ -276,11 +337,21 @@ class MessageHandler:
             new_msg = MessageHandler.Message(time_recvd, sender, message)
             self.wm.prev_message = new_msg
 
+            # teammates' messages come as (hear time direction our unum msg),
+            # and may tell us where they've seen the ball.
+            if len(msg) > 4 and msg[3] == "our":
+                report = say_codec.decode(message, time_recvd)
+                if report is not None:
+                    self.wm.process_ball_report(report)
+
     def _handle_sense_body(self, msg):
         """
         Deals with the agent's body model information.
         """
 
+        # the simulation cycle of the soccer server
+        self.wm.sim_time = msg[1]
+
         # update the body model information when received. each piece of info is
         # a list with the first item as the name of the data, and the rest as
         # the values.
@@ -322,14 +393,28 @@ class MessageHandler:
             else:
                 pass
 
+        # remember the body state for this cycle along with what we last saw
+        self.wm.record_snapshot()
+
     def _handle_change_player_type(self, msg):
         """
-        Handle player change messages.
+        Handle player change messages.  These come as (change_player_type unum
+        type) for our teammates, but without the type for opponents.
         """
 
+        uniform_number = msg[1]
+
+        if len(msg) > 2:
+            self.wm.player_type_ids[(self.wm.side, uniform_number)] = msg[2]
+        else:
+            side = self.wm.get_opponent_side()
+            self.wm.player_type_ids[(side, uniform_number)] = None
+
     def _handle_player_param(self, msg):
         """
-        Deals with player parameter information.
+        Deals with player parameter information.  These only say how the
+        server generates player types, and we're sent every type it made, so
+        there's nothing here we need.
         """
 
     def _handle_player_type(self, msg):
@@ -337,29 +422,25 @@ class MessageHandler:
         Handles player type information.
         """
 
+        values = dict(param for param in msg[1:] if len(param) == 2)
+        self.wm.player_types.set_type(values)
+
     def _handle_server_param(self, msg):
         """
         Stores server parameter information.
         """
-        
-        # each list is two items: a value name and its value.  we add them all
-        # to the ServerParameters class inside WorldModel programmatically.
-        for param in msg[1:]:
-            # put all [param, value] pairs into the server settings object
-            # by setting the attribute programmatically.
-            if len(param) != 2:
-                continue
-            
-            # the parameter and its value
-            key = param[0]
-            value = param[1]
-
-            # set the attribute if it was accounted for, otherwise alert the user
-            if hasattr(self.wm.server_parameters, key):
-                setattr(self.wm.server_parameters, key, value)
-            else:
-                raise AttributeError("Couldn't find a matching parameter in "
-                        "ServerParameters class: '%s'" % key)
+
+        # each list is two items: a value name and its value.  they're all
+        # loaded at once, and any the ServerParameters class doesn't know
+        # about are kept aside rather than rejected.
+        pairs = [param for param in msg[1:] if len(param) == 2]
+        self.wm.server_parameters.load(pairs)
+
+        # the positions of some landmarks depend on the server parameters
+        self.wm.update_landmarks()
+
+        # as do the constants derived for each player type
+        self.wm.update_player_types()
 
     def _handle_init(self, msg):
         """
@@ -397,7 +478,10 @@ class ActionHandler:
     Provides facilities for sending commands to the soccer server.  Contains all
     possible commands that can be sent, as well as everything needed to send
     them.  All basic command methods are aliases for placing that command in the
-    internal queue and sending it at the appropriate time.
+    current cycle's command slots and sending it at the appropriate time.
+
+    Commands are enqueued and sent from the same thread, so the slots aren't
+    locked.
     """
 
     class CommandType:
@@ -424,54 +508,127 @@ class ActionHandler:
             raise NotImplementedError("Can't instantiate a CommandType, access "
                     "its members through ActionHandler instead.")
 
-    # a command for our queue containing an id and command text
+    # a command for our slots containing an id and command text
     Command = collections.namedtuple("Command", "cmd_type text")
 
-    def __init__(self, server_socket):
+    def __init__(self, server_socket, coalesce=False, precision=2,
+            recorder=None, trace=None):
         """
         Save the socket that connects us to the soccer server to allow us to
-        send it commands.
+        send it commands.  If 'coalesce' is True, all the commands of a cycle
+        are sent together in a single datagram rather than one apiece.
+        Command values are sent with 'precision' decimal places.  Everything
+        sent is also written to 'recorder', a match_recorder.MatchRecorder, and
+        'trace', a trace_buffer.TraceBuffer, if they're given.
         """
 
         self.sock = server_socket
+        self.coalesce = coalesce
+        self.recorder = recorder
+        self.trace = trace
 
-        # this contains all requested actions for the current and future cycles
-        self.q = queue.Queue()
+        # builds the text of our commands.  the world model gives it the server
+        # parameters to clamp command values with.
+        self.encoder = command_encoder.CommandEncoder(precision=precision)
 
-    def send_commands(self):
+        # the actions requested for this cycle.  only the last primary command
+        # is sent, so it simply overwrites any before it.
+        self.primary_cmd = None
+        self.secondary_cmds = []
+
+        # how many primary commands were overwritten before being sent
+        self.overwritten_primaries = 0
+
+        # bytes and datagrams sent by the last call to send_commands
+        self.cycle_bytes = 0
+        self.cycle_datagrams = 0
+
+        # bytes and datagrams sent in total, including 'done' messages
+        self.bytes_sent = 0
+        self.datagrams_sent = 0
+
+    def _send(self, datagram):
         """
-        Sends all the enqueued commands.
+        Sends a null-terminated datagram to the server, keeping count of what
+        we've sent.
         """
 
-        # we only send the most recent primary command
-        primary_cmd = None
+        self.sock.send(datagram, False)
 
-        # dequeue all enqueued commands and send them
-        while 1:
-            try:
-                cmd = self.q.get_nowait()
-            except queue.Empty:
-                break
+        if self.trace is not None:
+            self.trace.record(trace_buffer.SENT, datagram)
 
-            # save the most recent primary command and send it at the very end
-            if cmd.cmd_type == ActionHandler.CommandType.TYPE_PRIMARY:
-                primary_cmd = cmd
-            # send other commands immediately
-            else:
-                if PRINT_SENT_COMMANDS:
-                    print "sent:", cmd.text, "\n"
+        if self.recorder is not None:
+            self.recorder.record_sent(datagram)
+
+        self.cycle_bytes += len(datagram)
+        self.cycle_datagrams += 1
 
-                self.sock.send(cmd.text)
+    def send_commands(self):
+        """
+        Sends all the enqueued commands.  Secondary commands are sent in the
+        order they were enqueued, followed by the most recent primary command.
+        """
 
-            # indicate that we finished processing a command
-            self.q.task_done()
+        # take this cycle's commands, leaving empty slots for the next
+        primary_cmd = self.primary_cmd
+        secondary_cmds = self.secondary_cmds
+        self.primary_cmd = None
+        self.secondary_cmds = []
 
-        # send the saved primary command, if there was one
+        texts = [cmd.text for cmd in secondary_cmds]
         if primary_cmd is not None:
-            if PRINT_SENT_COMMANDS:
-                print "sent:", primary_cmd.text, "\n"
+            texts.append(primary_cmd.text)
+
+        self.cycle_bytes = 0
+        self.cycle_datagrams = 0
 
-            self.sock.send(primary_cmd.text)
+        # the server reads every command in a datagram, so we can save a send
+        # per command by putting them all in one.
+        if self.coalesce:
+            if len(texts) > 0:
+                texts.append("\0")
+                self._send("".join(texts))
+        else:
+            for text in texts:
+                self._send(text + "\0")
+
+        self.bytes_sent += self.cycle_bytes
+        self.datagrams_sent += self.cycle_datagrams
+
+    def enqueue(self, cmd):
+        """
+        Puts a command in this cycle's slots, replacing any primary command
+        already there if it's a primary command itself.
+        """
+
+        if cmd.cmd_type == ActionHandler.CommandType.TYPE_PRIMARY:
+            if self.primary_cmd is not None:
+                self.overwritten_primaries += 1
+
+            self.primary_cmd = cmd
+        else:
+            self.secondary_cmds.append(cmd)
+
+    def send_done(self):
+        """
+        Tells the server we've sent all our commands for this cycle, allowing
+        it to move on to the next one in synchronous mode.  Sent immediately,
+        so call it only after send_commands.
+        """
+
+        # the same datagram is sent, traced, and recorded
+        datagram = command_encoder.CommandEncoder.DONE + "\0"
+        self.sock.send(datagram, False)
+
+        if self.trace is not None:
+            self.trace.record(trace_buffer.SENT, datagram)
+
+        if self.recorder is not None:
+            self.recorder.record_sent(datagram)
+
+        self.bytes_sent += len(datagram)
+        self.datagrams_sent += 1
 
     def move(self, x, y):
         """
@@ -481,13 +638,13 @@ class ActionHandler:
         a random location on their side of the field.
         """
 
-        msg = "(move %.10f %.10f)" % (x, y)
+        msg = self.encoder.move(x, y)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
     def turn(self, relative_degrees):
         """
@@ -495,29 +652,26 @@ class ActionHandler:
         angle.
         """
 
-        # disallow unreasonable turning
-        assert -180 <= relative_degrees <= 180
-
-        msg = "(turn %.10f)" % relative_degrees
+        msg = self.encoder.turn(relative_degrees)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
     def dash(self, power):
         """
         Accelerate the player in the direction its body currently faces.
         """
 
-        msg = "(dash %.10f)" % power
+        msg = self.encoder.dash(power)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
     def kick(self, power, relative_direction):
         """
@@ -525,13 +679,13 @@ class ActionHandler:
         relative to the current direction of the player's body.
         """
 
-        msg = "(kick %.10f %.10f)" % (power, relative_direction)
+        msg = self.encoder.kick(power, relative_direction)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
     def catch(self, relative_direction):
         """
@@ -539,13 +693,13 @@ class ActionHandler:
         remains there until the goalie kicks it away.
         """
 
-        msg = "(catch %.10f)" % relative_direction
+        msg = self.encoder.catch(relative_direction)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
     def say(self, message):
         """
@@ -553,13 +707,13 @@ class ActionHandler:
         in length, but that isn't enforced here.
         """
 
-        msg = "(say %s)" % message
+        msg = self.encoder.say(message)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_SECONDARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
     def turn_neck(self, relative_direction):
         """
@@ -567,11 +721,11 @@ class ActionHandler:
         angle is relative to body angle.
         """
 
-        msg = "(turn_neck %.10f)" % relative_direction
+        msg = self.encoder.turn_neck(relative_direction)
 
-        # create the command object for insertion into the queue
+        # create the command object for insertion into the slots
         cmd_type = ActionHandler.CommandType.TYPE_SECONDARY
         cmd = ActionHandler.Command(cmd_type, msg)
 
-        self.q.put(cmd)
+        self.enqueue(cmd)
 
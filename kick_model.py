@@ -0,0 +1,141 @@
+# the server parameters a KickModel is built from, besides the kickable margin
+PARAMETERS = ("kick_power_rate", "ball_decay", "ball_speed_max", "maxpower")
+
+def max_kick_speed(server_parameters, factor):
+    """
+    Returns the fastest a full power kick can send a still ball, when the given
+    fraction of its power reaches the ball.
+    """
+
+    sp = server_parameters
+    return min(sp.ball_speed_max, sp.maxpower * factor * sp.kick_power_rate)
+
+class KickModel:
+    """
+    Lookup tables describing how well the ball can be kicked from each position
+    inside the kickable area, built once from a set of server parameters.
+
+    Tables are indexed by the distance between the edges of the player and the
+    ball (from 0 to kickable_margin) and by the absolute direction of the ball
+    relative to the player's body (from 0 to 180 degrees).  Lookups between the
+    table entries are linearly interpolated.  See formula 4.21 in the
+    documentation for the underlying kick model.
+    """
+
+    def __init__(self, server_parameters, kickable_margin, dist_steps=8,
+            dir_steps=13):
+        """
+        Builds the tables with the given number of entries along the distance
+        and direction axes.
+        """
+
+        sp = server_parameters
+
+        self.kick_power_rate = sp.kick_power_rate
+        self.kickable_margin = kickable_margin
+        self.ball_decay = sp.ball_decay
+        self.ball_speed_max = sp.ball_speed_max
+        self.maxpower = sp.maxpower
+
+        # how far a ball goes in each number of cycles, and before it stops,
+        # per unit of its initial speed.
+        self.ball_travel = sp.derived("ball_travel")
+        self.travel_limit = sp.derived("ball_travel_limit")
+
+        self.dist_steps = dist_steps
+        self.dir_steps = dir_steps
+        self.dist_step = kickable_margin / float(dist_steps - 1)
+        self.dir_step = 180.0 / (dir_steps - 1)
+
+        # the fraction of a kick's power that actually reaches the ball
+        self.factors = []
+
+        # the fastest the ball can be sent off with a single kick
+        self.max_speeds = []
+
+        # how far a still ball travels after the strongest single kick
+        self.max_dists = []
+
+        for i in xrange(dist_steps):
+            dist = i * self.dist_step
+
+            factors = []
+            max_speeds = []
+            max_dists = []
+            for j in xrange(dir_steps):
+                direction = j * self.dir_step
+
+                factor = 1 - 0.25 * (direction / 180.0) - 0.25 * (dist /
+                        kickable_margin)
+                max_speed = max_kick_speed(sp, factor)
+
+                factors.append(factor)
+                max_speeds.append(max_speed)
+                max_dists.append(max_speed * self.travel_limit)
+
+            self.factors.append(factors)
+            self.max_speeds.append(max_speeds)
+            self.max_dists.append(max_dists)
+
+    def _lookup(self, table, dist, direction):
+        """
+        Returns the bilinearly interpolated table value for the given ball
+        distance and direction.  Values outside the table are clamped to it.
+        """
+
+        # find our fractional position in the table along each axis
+        fi = min(max(dist / self.dist_step, 0), self.dist_steps - 1)
+        fj = min(abs(direction) / self.dir_step, self.dir_steps - 1)
+
+        i = min(int(fi), self.dist_steps - 2)
+        j = min(int(fj), self.dir_steps - 2)
+        di = fi - i
+        dj = fj - j
+
+        row1 = table[i]
+        row2 = table[i + 1]
+        top = row1[j] + (row1[j + 1] - row1[j]) * dj
+        bottom = row2[j] + (row2[j + 1] - row2[j]) * dj
+
+        return top + (bottom - top) * di
+
+    def kick_factor(self, dist, direction):
+        """
+        Returns the fraction of a kick's power that reaches a ball at the given
+        edge distance and body-relative direction.
+        """
+
+        return self._lookup(self.factors, dist, direction)
+
+    def max_ball_speed(self, dist, direction):
+        """
+        Returns the fastest a single kick can send a still ball at the given
+        edge distance and body-relative direction.
+        """
+
+        return self._lookup(self.max_speeds, dist, direction)
+
+    def max_kick_distance(self, dist, direction):
+        """
+        Returns the furthest a single kick can send a still ball at the given
+        edge distance and body-relative direction.
+        """
+
+        return self._lookup(self.max_dists, dist, direction)
+
+    def speed_for_distance(self, distance, extra_power=0.0):
+        """
+        Returns the speed a ball needs to come to a stop after travelling the
+        given distance, scaled up by 'extra_power' (0.0 meaning no extra speed).
+        """
+
+        return distance / self.travel_limit * (1.0 + extra_power)
+
+    def power_for_accel(self, dist, direction, accel):
+        """
+        Returns the kick power needed to accelerate a ball at the given edge
+        distance and body-relative direction by 'accel', capped at maxpower.
+        """
+
+        rate = self.kick_factor(dist, direction) * self.kick_power_rate
+        return min(accel / rate, self.maxpower)
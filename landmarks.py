@@ -0,0 +1,108 @@
+import array
+
+# dimensions of the pitch as laid out by the soccer server.  these aren't
+# server parameters, so they never change.
+PITCH_LENGTH = 105.0
+PITCH_WIDTH = 68.0
+PENALTY_AREA_LENGTH = 16.5
+PENALTY_AREA_WIDTH = 40.32
+
+# how far outside the pitch the perimeter flags are placed
+PITCH_MARGIN = 5.0
+
+class LandmarkTable:
+    """
+    The fixed landmarks on the field, ie. flags and goals, stored as parallel
+    arrays of x and y coordinates.  Each landmark is identified by an integer
+    index, which is mapped to from the name tuple the message parser produces
+    for it, eg. ('f', 't', 'r', 10) or ('g', 'l').
+
+    Coordinates are absolute, with the positive x-axis pointing at the right
+    goal and the positive y-axis pointing at the top of the field (the side
+    whose flags are named 't').
+    """
+
+    def __init__(self, goal_width=14.02):
+        """
+        Lays out every landmark, placing the goal post flags according to the
+        given goal width.
+        """
+
+        self.goal_width = goal_width
+
+        # name tuples of all landmarks, by index
+        self.names = []
+
+        # maps name tuples to landmark indexes
+        self.index = {}
+
+        # coordinates of all landmarks, by index
+        self.xs = array.array('d')
+        self.ys = array.array('d')
+
+        half_length = PITCH_LENGTH / 2
+        half_width = PITCH_WIDTH / 2
+        outer_x = half_length + PITCH_MARGIN
+        outer_y = half_width + PITCH_MARGIN
+        penalty_x = half_length - PENALTY_AREA_LENGTH
+        penalty_y = PENALTY_AREA_WIDTH / 2
+        goal_y = goal_width / 2
+
+        # center flag and those on the boundary lines
+        self._add(('f', 'c'), 0, 0)
+        for v, y in (('t', half_width), ('b', -half_width)):
+            self._add(('f', 'l', v), -half_length, y)
+            self._add(('f', 'c', v), 0, y)
+            self._add(('f', 'r', v), half_length, y)
+
+        # perimeter flags above and below the field, every 10 units
+        for v, y in (('t', outer_y), ('b', -outer_y)):
+            self._add(('f', v, 0), 0, y)
+            for dist in xrange(10, 60, 10):
+                self._add(('f', v, 'l', dist), -dist, y)
+                self._add(('f', v, 'r', dist), dist, y)
+
+        # perimeter flags left and right of the field, every 10 units
+        for h, x in (('l', -outer_x), ('r', outer_x)):
+            self._add(('f', h, 0), x, 0)
+            for dist in xrange(10, 40, 10):
+                self._add(('f', h, 't', dist), x, dist)
+                self._add(('f', h, 'b', dist), x, -dist)
+
+        # goals, their posts, and the penalty area corners
+        for h, sign in (('l', -1), ('r', 1)):
+            self._add(('g', h), sign * half_length, 0)
+            self._add(('f', 'g', h, 't'), sign * half_length, goal_y)
+            self._add(('f', 'g', h, 'b'), sign * half_length, -goal_y)
+
+            self._add(('f', 'p', h, 't'), sign * penalty_x, penalty_y)
+            self._add(('f', 'p', h, 'c'), sign * penalty_x, 0)
+            self._add(('f', 'p', h, 'b'), sign * penalty_x, -penalty_y)
+
+    def _add(self, name, x, y):
+        """
+        Appends a landmark to the table.
+        """
+
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.xs.append(x)
+        self.ys.append(y)
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        """
+        Returns the index of the landmark with the given name list or tuple, or
+        None if there's no such landmark.
+        """
+
+        return self.index.get(tuple(name))
+
+    def coords(self, i):
+        """
+        Returns the (x, y) coordinates of the landmark with the given index.
+        """
+
+        return (self.xs[i], self.ys[i])
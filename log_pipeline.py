@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+
+import collections
+import math
+import multiprocessing
+import os
+
+import handler
+import match_recorder
+import message_parser
+import sp_exceptions
+from world_model import WorldModel
+
+# what we learned about a single cycle of a match.  'possession' is the side
+# whose nearest player is closest to the ball, or None if we can't tell.
+# 'localization_error' is how far our estimate of our own position was from
+# the truth, which is only known when the server sent us fullstate.
+CycleSummary = collections.namedtuple("CycleSummary",
+        "cycle possession localization_error")
+
+# the kinds of events the handle stage yields
+CYCLE = "cycle"
+COMMAND = "command"
+
+def read_records(path):
+    """
+    Yields a (direction, text) tuple for every datagram in a log, without
+    loading the whole log.  Text logs only hold received messages.
+    """
+
+    if not match_recorder.is_binary_log(path):
+        for message in match_recorder.iter_log_messages(path):
+            yield (match_recorder.RECEIVED, message)
+
+        return
+
+    log = match_recorder.MatchLog(path)
+    try:
+        for record in log.records():
+            yield (record.direction, record.payload.rstrip("\0").strip())
+    finally:
+        log.close()
+
+def parse_records(records):
+    """
+    Parses the text of every record.  Sent datagrams can carry several
+    commands, so each of their commands is yielded as a record of its own.
+    """
+
+    for direction, text in records:
+        if len(text) == 0:
+            continue
+
+        if direction == match_recorder.RECEIVED:
+            yield (direction, message_parser.parse(text))
+        else:
+            for command in message_parser.split(text):
+                yield (direction, message_parser.parse(command))
+
+def _summarize_cycle(wm, truth):
+    """
+    Returns a CycleSummary of the current state of a world model.  'truth' is
+    a world model that's only been given fullstate messages, or None if the
+    server hasn't sent any.
+    """
+
+    possession = None
+    ball_state = wm.get_ball_state()
+    if ball_state is not None and wm.side is not None:
+        ball = ball_state[0]
+
+        # an unknown position is stored as (None, None)
+        ours = None
+        if wm.abs_coords[0] is not None:
+            ours = math.hypot(wm.abs_coords[0] - ball[0],
+                              wm.abs_coords[1] - ball[1])
+
+        teammates = wm.get_nearest_players_to_point(ball, 1, wm.side)
+        if len(teammates) > 0 and (ours is None or teammates[0][0] < ours):
+            ours = teammates[0][0]
+
+        theirs = None
+        opponents = wm.get_nearest_players_to_point(ball, 1,
+                wm.get_opponent_side())
+        if len(opponents) > 0:
+            theirs = opponents[0][0]
+
+        if ours is not None and (theirs is None or ours <= theirs):
+            possession = wm.side
+        elif theirs is not None:
+            possession = wm.get_opponent_side()
+
+    error = None
+    if (truth is not None and truth.fullstate_time == wm.sim_time and
+            wm.abs_coords[0] is not None and
+            truth.abs_coords[0] is not None):
+        error = math.hypot(wm.abs_coords[0] - truth.abs_coords[0],
+                           wm.abs_coords[1] - truth.abs_coords[1])
+
+    return CycleSummary(wm.sim_time, possession, error)
+
+def handle_records(records, teamname=None):
+    """
+    Runs parsed received messages through a MessageHandler and WorldModel,
+    yielding a (CYCLE, CycleSummary) event at the end of every cycle and a
+    (COMMAND, name) event for every command we sent.  Our team name is taken
+    from the 'init' command in the log if it isn't given.
+
+    Fullstate messages are kept from the world model, so it has to work out
+    where it is from what it sees like it would in a real match, and are
+    given to a separate world model that's used as the truth instead.
+    """
+
+    # nothing is ever sent, so the action handlers don't need sockets
+    wm = WorldModel(handler.ActionHandler(None))
+    wm.teamname = teamname
+    msg_handler = handler.MessageHandler(wm)
+
+    truth = None
+    truth_handler = None
+
+    for direction, parsed in records:
+        if direction != match_recorder.RECEIVED:
+            # agents log the 'init' they connect with, which names their team
+            if parsed[0] == "init" and teamname is None:
+                wm.teamname = parsed[1]
+
+            yield (COMMAND, parsed[0])
+            continue
+
+        msg_type = parsed[0]
+
+        if msg_type == "fullstate":
+            if truth is None:
+                truth = WorldModel(handler.ActionHandler(None))
+                truth_handler = handler.MessageHandler(truth)
+
+            truth.teamname = wm.teamname
+            truth.side = wm.side
+            truth.uniform_number = wm.uniform_number
+            truth_handler.handle_parsed(parsed)
+            continue
+
+        # each 'sense_body' starts a new cycle, so the state we have is all
+        # we'll learn about the one before it.
+        if (msg_type == "sense_body" and wm.sim_time is not None and
+                parsed[1] != wm.sim_time):
+            yield (CYCLE, _summarize_cycle(wm, truth))
+
+        try:
+            msg_handler.handle_parsed(parsed)
+        except sp_exceptions.SoccerServerError:
+            # errors only say a command was rejected, which doesn't affect
+            # what we know about the world.
+            pass
+
+    if wm.sim_time is not None:
+        yield (CYCLE, _summarize_cycle(wm, truth))
+
+def aggregate(events):
+    """
+    Reduces the events of a match to a dict of its statistics.
+    """
+
+    stats = {
+        "cycles": 0,
+        "possession": {WorldModel.SIDE_L: 0, WorldModel.SIDE_R: 0},
+        "localization_samples": 0,
+        "localization_error_total": 0.0,
+        "localization_error_max": 0.0,
+        "commands": {},
+    }
+
+    for event, value in events:
+        if event == COMMAND:
+            stats["commands"][value] = stats["commands"].get(value, 0) + 1
+            continue
+
+        stats["cycles"] += 1
+
+        if value.possession is not None:
+            stats["possession"][value.possession] += 1
+
+        if value.localization_error is not None:
+            stats["localization_samples"] += 1
+            stats["localization_error_total"] += value.localization_error
+            stats["localization_error_max"] = max(
+                    stats["localization_error_max"], value.localization_error)
+
+    return stats
+
+def process_log(path, teamname=None):
+    """
+    Streams a single log through every stage of the pipeline, returning the
+    statistics of its match.
+    """
+
+    records = parse_records(read_records(path))
+    return aggregate(handle_records(records, teamname))
+
+def _process_job(job):
+    """
+    Processes a single log in a worker process, returning its path along with
+    its statistics and None, or None and the error that stopped it.  Errors
+    are returned rather than raised so one bad log doesn't stop the rest.
+    """
+
+    path, teamname = job
+    try:
+        return (path, process_log(path, teamname), None)
+    except Exception, e:
+        return (path, None, "%s: %s" % (type(e).__name__, e))
+
+def find_logs(directory):
+    """
+    Returns the paths of every log in a directory, ie. every file except the
+    indexes written alongside binary logs.
+    """
+
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and not name.endswith(".idx"):
+            paths.append(path)
+
+    return paths
+
+def summarize(results):
+    """
+    Combines the (path, stats, error) results of many logs into one report.
+    """
+
+    matches = {}
+    errors = {}
+
+    cycles = 0
+    possession = {WorldModel.SIDE_L: 0, WorldModel.SIDE_R: 0}
+    samples = 0
+    error_total = 0.0
+    error_max = 0.0
+    commands = {}
+
+    for path, stats, error in results:
+        if error is not None:
+            errors[path] = error
+            continue
+
+        matches[path] = stats
+
+        cycles += stats["cycles"]
+        for side, count in stats["possession"].iteritems():
+            possession[side] += count
+
+        samples += stats["localization_samples"]
+        error_total += stats["localization_error_total"]
+        error_max = max(error_max, stats["localization_error_max"])
+
+        for name, count in stats["commands"].iteritems():
+            commands[name] = commands.get(name, 0) + count
+
+    possessed = sum(possession.values())
+    possession_l = None
+    if possessed > 0:
+        possession_l = possession[WorldModel.SIDE_L] / float(possessed)
+
+    mean_error = None
+    if samples > 0:
+        mean_error = error_total / samples
+
+    return {
+        "matches": matches,
+        "errors": errors,
+        "summary": {
+            "logs": len(matches) + len(errors),
+            "failed": len(errors),
+            "cycles": cycles,
+            "possession_l": possession_l,
+            "localization_error_mean": mean_error,
+            "localization_error_max": error_max if samples > 0 else None,
+            "commands": commands,
+        }
+    }
+
+def process_logs(paths, teamname=None, processes=None):
+    """
+    Shards logs across a pool of processes, each streaming its logs through
+    the pipeline one at a time, and returns the report summarizing them all.
+    """
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        jobs = [(path, teamname) for path in paths]
+        results = list(pool.imap_unordered(_process_job, jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+    return summarize(results)
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Gather statistics from "
+            "many recorded matches at once.")
+    parser.add_argument("logs", nargs="+", help="match_recorder logs, text "
+            "files of server messages, or directories of either")
+    parser.add_argument("--team", default=None,
+            help="name of the recording agents' team, for logs that don't "
+            "say")
+    parser.add_argument("--processes", type=int, default=None,
+            help="how many logs to process at once, one per cpu by default")
+    parser.add_argument("--output", default=None,
+            help="file to write the JSON report to, instead of stdout")
+    options = parser.parse_args()
+
+    paths = []
+    for path in options.logs:
+        if os.path.isdir(path):
+            paths.extend(find_logs(path))
+        else:
+            paths.append(path)
+
+    report = process_logs(paths, options.team, options.processes)
+
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print json.dumps(report, indent=2)
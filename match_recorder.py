@@ -0,0 +1,303 @@
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+# every log starts with this and the version of its format
+MAGIC = "MREC"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sI")
+
+# each record is its timestamp, its direction, and the length of its payload,
+# followed by the payload itself.
+RECORD_HEADER = struct.Struct("<dBI")
+
+# each entry of a log's index is a cycle and the offset of the 'sense_body'
+# record that starts it.
+INDEX_ENTRY = struct.Struct("<iQ")
+
+# the directions a record can go in
+RECEIVED = 0
+SENT = 1
+
+# a single datagram from a log
+Record = collections.namedtuple("Record", "timestamp direction payload")
+
+def index_path(path):
+    """
+    Returns the path of the index of the log at the given path.
+    """
+
+    return path + ".idx"
+
+def message_cycle(message):
+    """
+    Returns the cycle of a 'sense_body' message, or None for any other message.
+    These mark the start of each new cycle in a recording.
+    """
+
+    if message.startswith("(sense_body "):
+        return int(message[12:message.index(" ", 12)])
+
+    return None
+
+def is_binary_log(path):
+    """
+    Returns whether the file at the given path is a binary log, rather than a
+    text file of messages.
+    """
+
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class MatchRecorder:
+    """
+    Writes every datagram an agent receives and every one it sends to an
+    append-only binary log, along with the time it happened.  The start of
+    each cycle is written to a separate index, so readers can go straight to
+    any cycle without scanning the log.
+
+    Datagrams are received and sent from different threads, so writes are
+    locked.
+    """
+
+    def __init__(self, path):
+        """
+        Creates a new log at the given path, replacing any that was there.
+        """
+
+        self.path = path
+        self.log = open(path, "wb")
+        self.index = open(index_path(path), "wb")
+
+        self.log.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.offset = FILE_HEADER.size
+
+        # the last cycle we wrote to the index
+        self.last_cycle = None
+
+        self.lock = threading.Lock()
+
+    def record(self, direction, payload, timestamp=None):
+        """
+        Appends a datagram going in the given direction to the log, stamped
+        with the given time or the current one.
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            if self.log is None:
+                return
+
+            offset = self.offset
+            self.log.write(RECORD_HEADER.pack(timestamp, direction,
+                len(payload)))
+            self.log.write(payload)
+            self.offset += RECORD_HEADER.size + len(payload)
+
+            if direction != RECEIVED:
+                return
+
+            # the server sends 'sense_body' several times a cycle before the
+            # kick off, so only the first of each cycle is indexed.
+            cycle = message_cycle(payload)
+            if cycle is not None and (self.last_cycle is None or
+                    cycle > self.last_cycle):
+                self.last_cycle = cycle
+                self.index.write(INDEX_ENTRY.pack(cycle, offset))
+
+                # agents are often killed rather than disconnected, so we make
+                # sure each finished cycle reaches the disk.
+                self.log.flush()
+                self.index.flush()
+
+    def record_received(self, payload):
+        """
+        Appends a datagram received from the server to the log.
+        """
+
+        self.record(RECEIVED, payload)
+
+    def record_sent(self, payload):
+        """
+        Appends a datagram sent to the server to the log.
+        """
+
+        self.record(SENT, payload)
+
+    def close(self):
+        """
+        Writes everything out and closes the log.  Anything recorded after this
+        is ignored.
+        """
+
+        with self.lock:
+            if self.log is None:
+                return
+
+            self.log.close()
+            self.index.close()
+            self.log = None
+            self.index = None
+
+class MatchLog:
+    """
+    Reads a log written by a MatchRecorder.  The log is memory-mapped, so only
+    the parts that are read are ever loaded, and its index lets us start
+    reading at any cycle.
+    """
+
+    def __init__(self, path):
+        """
+        Opens the log at the given path.  If its index is missing, one is built
+        by scanning the log.
+        """
+
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("'%s' isn't a version %d match log" %
+                    (path, VERSION))
+
+        # the cycles in the index in order, and the offset each starts at
+        self.cycles = []
+        self.offsets = []
+
+        if os.path.exists(index_path(path)):
+            self._load_index()
+        else:
+            self._build_index()
+
+    def _load_index(self):
+        """
+        Reads the index written alongside the log.
+        """
+
+        with open(index_path(self.path), "rb") as f:
+            data = f.read()
+
+        # an agent that was killed may have left a partial entry at the end
+        end = len(data) - len(data) % INDEX_ENTRY.size
+        for pos in xrange(0, end, INDEX_ENTRY.size):
+            cycle, offset = INDEX_ENTRY.unpack_from(data, pos)
+            self.cycles.append(cycle)
+            self.offsets.append(offset)
+
+    def _build_index(self):
+        """
+        Finds the start of every cycle by reading the whole log.
+        """
+
+        for offset, record in self._scan(FILE_HEADER.size):
+            if record.direction != RECEIVED:
+                continue
+
+            cycle = message_cycle(record.payload)
+            if cycle is not None and (len(self.cycles) == 0 or
+                    cycle > self.cycles[-1]):
+                self.cycles.append(cycle)
+                self.offsets.append(offset)
+
+    def _scan(self, offset):
+        """
+        Yields the offset and Record of every complete record in the log from
+        the given offset on.
+        """
+
+        m = self.map
+        size = len(m)
+        while offset + RECORD_HEADER.size <= size:
+            timestamp, direction, length = RECORD_HEADER.unpack_from(m, offset)
+
+            start = offset + RECORD_HEADER.size
+            end = start + length
+            if end > size:
+                break
+
+            yield offset, Record(timestamp, direction, m[start:end])
+            offset = end
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, cycle=None):
+        """
+        Yields every Record in the log, or only those from the start of the
+        given cycle on.  If the cycle isn't in the index, reading starts at the
+        first cycle after it.  Nothing is yielded for cycles past the end.
+        """
+
+        offset = FILE_HEADER.size
+        if cycle is not None:
+            offset = self.offset_of(cycle)
+            if offset is None:
+                return
+
+        for offset, record in self._scan(offset):
+            yield record
+
+    def offset_of(self, cycle):
+        """
+        Returns the offset of the first record of the earliest indexed cycle no
+        earlier than the given one, or None if there's no such cycle.
+        """
+
+        i = bisect.bisect_left(self.cycles, cycle)
+        if i == len(self.cycles):
+            return None
+
+        return self.offsets[i]
+
+    def messages(self, cycle=None, direction=RECEIVED):
+        """
+        Yields the text of every datagram going in the given direction, without
+        the null terminator, optionally starting at a given cycle.
+        """
+
+        for record in self.records(cycle):
+            if record.direction == direction:
+                yield record.payload.rstrip("\0").strip()
+
+    def close(self):
+        """
+        Releases the mapping and the file behind it.
+        """
+
+        self.map.close()
+        self.file.close()
+
+def iter_log_messages(path, direction=RECEIVED):
+    """
+    Yields the messages in a log, which is either a binary log written by a
+    MatchRecorder or a text file with one server message per line, like
+    'client_recv'.  Text files only hold received messages, so nothing is
+    yielded from them for any other direction.
+    """
+
+    if is_binary_log(path):
+        log = MatchLog(path)
+        try:
+            for message in log.messages(direction=direction):
+                yield message
+        finally:
+            log.close()
+
+        return
+
+    if direction != RECEIVED:
+        return
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) > 0:
+                yield line
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# starts an rcssserver in synchronous mode that plays a match without a human
+# having to kick off.  '{port}', '{coach_port}' and '{olcoach_port}' are
+# replaced with the ports for each match.
+DEFAULT_SERVER_CMD = ("rcssserver server::port={port} "
+        "server::coach_port={coach_port} server::olcoach_port={olcoach_port} "
+        "server::synch_mode=1 server::auto_mode=1 server::game_logging=0 "
+        "server::text_logging=0 server::nr_extra_halfs=0 "
+        "server::penalty_shoot_outs=0")
+
+# how many ports each match uses, ie. player, coach, and online coach
+PORTS_PER_MATCH = 3
+
+def run_agent(host, port, team_name, idle_timeout, coalesce=False,
+        record_path=None, trace_path=None):
+    """
+    Plays a single agent until the match is over, the server goes quiet for
+    'idle_timeout' seconds, or we're killed.  Prints the agent's statistics as a
+    line of JSON when done.  'coalesce' is whether the agent sends each cycle's
+    commands in a single datagram.  If 'record_path' is given, everything the
+    agent receives and sends is logged there by a match_recorder.  If
+    'trace_path' is given, the agent's latest traffic is dumped there when it
+    disconnects or dies.
+    """
+
+    import agent
+    import match_recorder
+    import trace_buffer
+    from world_model import WorldModel
+
+    recorder = None
+    if record_path is not None:
+        recorder = match_recorder.MatchRecorder(record_path)
+
+    trace = None
+    if trace_path is not None:
+        trace = trace_buffer.TraceBuffer(path=trace_path)
+
+    a = agent.Agent()
+    a.connect(host, port, team_name, coalesce_commands=coalesce,
+            recorder=recorder, trace=trace)
+    a.play()
+
+    last_time = None
+    last_change = time.time()
+    try:
+        while a.wm.play_mode != WorldModel.PlayModes.TIME_OVER:
+            time.sleep(0.1)
+
+            # give up once the server stops sending us anything new
+            if a.wm.sim_time != last_time:
+                last_time = a.wm.sim_time
+                last_change = time.time()
+            elif time.time() - last_change > idle_timeout:
+                break
+    finally:
+        stats = a.get_stats()
+        a.disconnect()
+
+        print json.dumps(stats)
+        sys.stdout.flush()
+
+class Match:
+    """
+    A single match: its server and agent processes, and the results they
+    report once it's over.
+    """
+
+    def __init__(self, match_id, port, options):
+        self.match_id = match_id
+        self.port = port
+        self.options = options
+
+        self.server = None
+
+        # (process, output file) for each agent
+        self.agents = []
+
+        self.agent_stats = []
+        self.wall_time = None
+        self.error = None
+
+    def run(self):
+        """
+        Starts the server and both teams, waits for the match to finish, then
+        shuts everything down.
+        """
+
+        opts = self.options
+        start = time.time()
+
+        try:
+            cmd = opts.server_cmd.format(port=self.port,
+                    coach_port=self.port + 1, olcoach_port=self.port + 2)
+            self.server = subprocess.Popen(cmd, shell=True,
+                    stdout=open(os.devnull, "w"), stderr=subprocess.STDOUT)
+
+            # give the server a moment to start listening
+            time.sleep(opts.server_startup)
+
+            for team_name in (opts.team_l, opts.team_r):
+                for i in xrange(opts.players):
+                    self.agents.append(self._spawn_agent(team_name, i))
+
+                # make sure all of the first team gets the left side
+                time.sleep(opts.server_startup)
+
+            # wait for the agents to report, killing them if they take too long
+            deadline = start + opts.time_limit
+            for p, output in self.agents:
+                while p.poll() is None and time.time() < deadline:
+                    time.sleep(0.1)
+
+                if p.poll() is None:
+                    p.terminate()
+                p.wait()
+
+                # the stats are the last line of JSON the agent printed
+                output.seek(0)
+                lines = [l for l in output if l.startswith("{")]
+                if len(lines) > 0:
+                    self.agent_stats.append(json.loads(lines[-1]))
+
+        except Exception, e:
+            self.error = str(e)
+
+        finally:
+            for p, output in self.agents:
+                if p.poll() is None:
+                    p.kill()
+                output.close()
+
+            if self.server is not None and self.server.poll() is None:
+                self.server.terminate()
+                self.server.wait()
+
+            self.wall_time = time.time() - start
+
+    def _spawn_agent(self, team_name, index):
+        """
+        Starts a process running the agent at the given index of a team for
+        this match, returning it along with the file its output goes to.
+        """
+
+        cmd = [sys.executable, os.path.abspath(__file__), "--agent",
+               self.options.host, str(self.port), team_name,
+               str(self.options.idle_timeout), str(int(self.options.coalesce))]
+
+        # where to record the agent's traffic and dump its trace, if anywhere
+        name = "match%d_%s_%d" % (self.match_id, team_name, index)
+        for directory, extension in ((self.options.record, ".mlog"),
+                                     (self.options.trace, ".trace")):
+            if directory is not None:
+                cmd.append(os.path.join(directory, name + extension))
+            else:
+                cmd.append("")
+
+        # output goes to a file rather than a pipe, so a chatty agent can't
+        # block on a full pipe while we're waiting on the others.
+        output = tempfile.TemporaryFile()
+        p = subprocess.Popen(cmd, stdout=output,
+                stderr=open(os.devnull, "w"))
+
+        return (p, output)
+
+    def result(self):
+        """
+        Returns a dict summarizing the match.  Scores are those reported by
+        most agents, since any agent that lost track of the game is outvoted.
+        """
+
+        scores = {}
+        for s in self.agent_stats:
+            score = (s.get("score_l"), s.get("score_r"))
+            scores[score] = scores.get(score, 0) + 1
+
+        score_l = None
+        score_r = None
+        if len(scores) > 0:
+            score_l, score_r = max(scores, key=scores.get)
+
+        think_count = sum(s["think_count"] for s in self.agent_stats)
+        think_total = sum(s["think_time_total"] for s in self.agent_stats)
+        think_max = max([s["think_time_max"] for s in self.agent_stats] or [0])
+        cycles = max([s.get("sim_time") or 0 for s in self.agent_stats] or [0])
+        bytes_sent = sum(s.get("bytes_sent", 0) for s in self.agent_stats)
+        datagrams_sent = sum(s.get("datagrams_sent", 0)
+                             for s in self.agent_stats)
+        overwritten = sum(s.get("overwritten_primaries", 0)
+                          for s in self.agent_stats)
+
+        think_mean = 0.0
+        if think_count > 0:
+            think_mean = think_total / think_count
+
+        cycles_per_second = 0.0
+        if self.wall_time:
+            cycles_per_second = cycles / self.wall_time
+
+        return {
+            "match": self.match_id,
+            "port": self.port,
+            "score_l": score_l,
+            "score_r": score_r,
+            "cycles": cycles,
+            "wall_time": self.wall_time,
+            "cycles_per_second": cycles_per_second,
+            "agents_reporting": len(self.agent_stats),
+            "think_count": think_count,
+            "think_time_mean_ms": think_mean * 1000,
+            "think_time_max_ms": think_max * 1000,
+            "bytes_sent": bytes_sent,
+            "datagrams_sent": datagrams_sent,
+            "overwritten_primaries": overwritten,
+            "error": self.error,
+        }
+
+def run_matches(options):
+    """
+    Runs 'options.matches' matches, at most 'options.parallel' at a time, and
+    returns the report for all of them.  Each running match is managed by its
+    own thread, while the actual work happens in its server and agent
+    processes, which the operating system spreads across all cores.
+    """
+
+    matches = []
+    for i in xrange(options.matches):
+        port = options.base_port + i * options.port_step
+        matches.append(Match(i, port, options))
+
+    # run each match in a thread, limiting how many run at the same time
+    slots = threading.Semaphore(options.parallel)
+
+    def run(match):
+        try:
+            match.run()
+        finally:
+            slots.release()
+
+    threads = []
+    start = time.time()
+    for match in matches:
+        slots.acquire()
+
+        t = threading.Thread(target=run, args=(match,),
+                name="match_%d" % match.match_id)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    results = [m.result() for m in matches]
+    wall_time = time.time() - start
+
+    return {
+        "matches": results,
+        "summary": {
+            "matches": len(results),
+            "parallel": options.parallel,
+            "wall_time": wall_time,
+            "goals_l": sum(r["score_l"] or 0 for r in results),
+            "goals_r": sum(r["score_r"] or 0 for r in results),
+            "wins_l": len([r for r in results
+                           if (r["score_l"] or 0) > (r["score_r"] or 0)]),
+            "wins_r": len([r for r in results
+                           if (r["score_r"] or 0) > (r["score_l"] or 0)]),
+            "errors": len([r for r in results if r["error"] is not None]),
+        }
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing as mp
+
+    # internal mode used for the agent processes of each match
+    if len(sys.argv) > 1 and sys.argv[1] == "--agent":
+        run_agent(sys.argv[2], int(sys.argv[3]), sys.argv[4],
+                float(sys.argv[5]), bool(int(sys.argv[6])),
+                sys.argv[7] or None, sys.argv[8] or None)
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description="Run many matches at once "
+            "and report their results.")
+    parser.add_argument("matches", type=int, help="number of matches to run")
+    parser.add_argument("--parallel", type=int, default=mp.cpu_count(),
+            help="how many matches to run at the same time")
+    parser.add_argument("--players", type=int, default=11,
+            help="players per team")
+    parser.add_argument("--team-l", default="team_l",
+            help="name of the team that plays on the left")
+    parser.add_argument("--team-r", default="team_r",
+            help="name of the team that plays on the right")
+    parser.add_argument("--host", default="localhost",
+            help="host the servers run on")
+    parser.add_argument("--base-port", type=int, default=6000,
+            help="player port of the first match's server")
+    parser.add_argument("--port-step", type=int, default=10,
+            help="distance between the ports of consecutive matches")
+    parser.add_argument("--server-cmd", default=DEFAULT_SERVER_CMD,
+            help="command template that starts a server")
+    parser.add_argument("--server-startup", type=float, default=1.0,
+            help="seconds to wait for a server to start listening")
+    parser.add_argument("--time-limit", type=float, default=900.0,
+            help="seconds after which a match is abandoned")
+    parser.add_argument("--idle-timeout", type=float, default=5.0,
+            help="seconds of server silence after which an agent gives up")
+    parser.add_argument("--coalesce", action="store_true",
+            help="have agents send each cycle's commands in one datagram")
+    parser.add_argument("--record", default=None,
+            help="directory to write a match_recorder log of every agent to")
+    parser.add_argument("--trace", default=None,
+            help="directory to dump the trace of every agent to when it's "
+            "done")
+    parser.add_argument("--output", default=None,
+            help="file to write the JSON report to, instead of stdout")
+    options = parser.parse_args()
+
+    if options.port_step < PORTS_PER_MATCH:
+        parser.error("--port-step must be at least %d" % PORTS_PER_MATCH)
+
+    for directory in (options.record, options.trace):
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    report = run_matches(options)
+
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print json.dumps(report, indent=2)
@@ -135,6 +135,39 @@ def parse(text):
     # append the first '('.
     return result[0]
 
+def split(text):
+    """
+    Splits text holding several top-level parenthesized expressions, like a
+    datagram carrying more than one command, into a list of the expressions'
+    text.  Ex: "(dash 50)(turn 10)" becomes ["(dash 50)", "(turn 10)"].
+    """
+
+    expressions = []
+
+    # where the current expression starts, and how deeply nested we are in it
+    start = 0
+    indent = 0
+
+    in_string = False
+    prev_c = None
+    for i, c in enumerate(text):
+        if c == '"' and prev_c != "\\":
+            in_string = not in_string
+
+        elif c == "(" and not in_string:
+            if indent == 0:
+                start = i
+            indent += 1
+
+        elif c == ")" and not in_string:
+            indent -= 1
+            if indent == 0:
+                expressions.append(text[start:i + 1])
+
+        prev_c = c
+
+    return expressions
+
 if __name__ == "__main__":
     import sys
     
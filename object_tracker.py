@@ -0,0 +1,130 @@
+import collections
+import math
+
+import game_object
+
+class ObjectTracker:
+    """
+    Associates mobile objects across perception updates and keeps a short,
+    fixed-size history of absolute positions for each of them, from which
+    velocities and headings are estimated.
+
+    Tracks are keyed by identity: the ball has a single track, while players
+    are tracked by team name and uniform number.  Players seen from too far
+    away to make those out can't be associated, so they aren't tracked.
+    """
+
+    # the key of the ball's track
+    BALL = "ball"
+
+    def __init__(self, history_size=4, max_age=20):
+        """
+        history_size: how many past positions to keep per track.
+        max_age: how many cycles a track can go unseen before it's dropped.
+        """
+
+        self.history_size = history_size
+        self.max_age = max_age
+
+        # maps track keys to deques of (cycle, x, y), oldest first
+        self.tracks = {}
+
+        # the latest cycle we received observations for
+        self.latest_cycle = None
+
+    def key_for(self, obj):
+        """
+        Returns the track key for a game object, or None if it can't be
+        identified.
+        """
+
+        if isinstance(obj, game_object.Ball):
+            return ObjectTracker.BALL
+
+        # players are identified by their team and uniform number
+        if (isinstance(obj, game_object.Player) and obj.team is not None and
+                obj.uniform_number is not None):
+            return (obj.team, obj.uniform_number)
+
+        return None
+
+    def update(self, cycle, observations):
+        """
+        Adds the (key, (x, y)) observations made during the given cycle to their
+        tracks.  Observations for a cycle already in a track replace it.
+        """
+
+        # time going backwards means the game was reset, so start over
+        if self.latest_cycle is not None and cycle < self.latest_cycle:
+            self.clear()
+
+        self.latest_cycle = cycle
+
+        for key, (x, y) in observations:
+            track = self.tracks.get(key)
+            if track is None:
+                track = collections.deque(maxlen=self.history_size)
+                self.tracks[key] = track
+            elif len(track) > 0 and track[-1][0] == cycle:
+                track.pop()
+
+            track.append((cycle, x, y))
+
+        # forget about anything we haven't seen in a while
+        oldest = cycle - self.max_age
+        for key in [k for k, t in self.tracks.iteritems() if t[-1][0] < oldest]:
+            del self.tracks[key]
+
+    def estimate_velocities(self, keys=None):
+        """
+        Returns a dict mapping track keys to estimated (vx, vy) velocities,
+        found by fitting a least-squares line through each track's positions
+        over time.  Only the given keys are estimated if any are given, and
+        tracks with too little history to tell are left out.
+        """
+
+        if keys is None:
+            keys = self.tracks.keys()
+
+        velocities = {}
+        for key in keys:
+            track = self.tracks.get(key)
+            if track is None or len(track) < 2:
+                continue
+
+            n = float(len(track))
+            mean_c = sum(c for c, x, y in track) / n
+            mean_x = sum(x for c, x, y in track) / n
+            mean_y = sum(y for c, x, y in track) / n
+
+            var_c = 0.0
+            cov_x = 0.0
+            cov_y = 0.0
+            for c, x, y in track:
+                dc = c - mean_c
+                var_c += dc * dc
+                cov_x += dc * (x - mean_x)
+                cov_y += dc * (y - mean_y)
+
+            # all entries from the same cycle tell us nothing about motion
+            if var_c == 0:
+                continue
+
+            velocities[key] = (cov_x / var_c, cov_y / var_c)
+
+        return velocities
+
+    def clear(self):
+        """
+        Drops all tracks.
+        """
+
+        self.tracks.clear()
+        self.latest_cycle = None
+
+def heading(velocity):
+    """
+    Returns the absolute direction in degrees of a (vx, vy) velocity.
+    """
+
+    return math.degrees(math.atan2(velocity[1], velocity[0]))
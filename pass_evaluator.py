@@ -0,0 +1,132 @@
+import collections
+import math
+
+import ball_model
+
+# the result of evaluating a single pass target
+PassOption = collections.namedtuple("PassOption",
+        "score target receiver arrival_cycle opponent_cycle clearance reachable")
+
+def arrival_cycle(dist, speed, decay):
+    """
+    Returns the number of cycles a ball kicked at 'speed' takes to travel
+    'dist', or None if it comes to a stop first.
+    """
+
+    if dist <= 0:
+        return 0
+
+    if speed <= 0:
+        return None
+
+    # solve dist = speed * (1 - decay^t) / (1 - decay) for t
+    remaining = 1 - dist * (1 - decay) / speed
+    if remaining <= 0:
+        return None
+
+    return int(math.ceil(math.log(remaining) / math.log(decay)))
+
+def segment_clearance(start, end, points):
+    """
+    Returns the smallest distance from any of the given points to the line
+    segment between 'start' and 'end', or None if there are no points.
+    """
+
+    sx, sy = start
+    dx = end[0] - sx
+    dy = end[1] - sy
+    length_sq = dx * dx + dy * dy
+
+    clearance = None
+    for px, py in points:
+        # project the point onto the segment, clamping to its ends
+        if length_sq > 0:
+            t = ((px - sx) * dx + (py - sy) * dy) / length_sq
+            t = min(max(t, 0.0), 1.0)
+        else:
+            t = 0.0
+
+        cx = sx + t * dx
+        cy = sy + t * dy
+        d = math.sqrt((px - cx) ** 2 + (py - cy) ** 2)
+
+        if clearance is None or d < clearance:
+            clearance = d
+
+    return clearance
+
+def evaluate_passes(ball_pos, targets, receivers, opponent_groups,
+        kick_model, kick_pos, extra_power=0.0, clear_dist=5.0, horizon=50):
+    """
+    Scores kicking the ball from 'ball_pos' to each of the given target points
+    and returns a list of PassOptions, best first.  'receivers' holds the
+    intended receiver of each target (or None), 'opponent_groups' a
+    (positions, reach, margin) tuple for each type of the known opponents,
+    where 'reach' is the type's reach table from ball_model.reach_table and
+    'margin' how close it must get to the ball to take it, and 'kick_pos' the
+    (edge distance, body-relative direction) of the ball for the kick model.
+
+    Each score is the product of three factors in [0, 1]:
+      - reachability: whether a single kick can make the required speed.
+      - interception: how late in the pass the first opponent could get to
+        the ball, if before it arrives at all.
+      - clearance: how far the nearest opponent is from the passing lane,
+        relative to 'clear_dist'.
+    """
+
+    decay = kick_model.ball_decay
+    max_speed = kick_model.max_ball_speed(*kick_pos)
+
+    opponents = []
+    for positions, reach, margin in opponent_groups:
+        opponents.extend(positions)
+
+    options = []
+    for target, receiver in zip(targets, receivers):
+        dist = math.sqrt((target[0] - ball_pos[0]) ** 2 +
+                         (target[1] - ball_pos[1]) ** 2)
+
+        # can we kick hard enough to get the ball there in one go?
+        speed = kick_model.speed_for_distance(dist, extra_power)
+        reachable = speed <= max_speed
+        reach_score = 1.0
+        if not reachable:
+            reach_score = max_speed / speed
+            speed = max_speed
+
+        # a ball that stops short is considered to arrive where it stops
+        arrival = arrival_cycle(dist, speed, decay)
+        if arrival is None:
+            arrival = horizon
+        arrival = min(arrival, horizon)
+
+        # follow the ball along the lane, seeing when opponents can first get
+        # to it before it arrives.
+        angle = math.atan2(target[1] - ball_pos[1], target[0] - ball_pos[0])
+        velocity = (speed * math.cos(angle), speed * math.sin(angle))
+        trajectory = ball_model.predict_trajectory(ball_pos, velocity, decay,
+                arrival, kick_model.ball_travel)
+
+        opponent_cycle = None
+        for positions, reach, margin in opponent_groups:
+            for cycle in ball_model.solve_intercepts(trajectory, positions,
+                    reach, margin):
+                if cycle is not None and (opponent_cycle is None or
+                        cycle < opponent_cycle):
+                    opponent_cycle = cycle
+
+        intercept_score = 1.0
+        if opponent_cycle is not None:
+            intercept_score = opponent_cycle / float(arrival + 1)
+
+        clearance = segment_clearance(ball_pos, target, opponents)
+        clearance_score = 1.0
+        if clearance is not None:
+            clearance_score = min(clearance / clear_dist, 1.0)
+
+        score = reach_score * intercept_score * clearance_score
+        options.append(PassOption(score, target, receiver, arrival,
+            opponent_cycle, clearance, reachable))
+
+    options.sort(key=lambda o: o.score, reverse=True)
+    return options
@@ -0,0 +1,190 @@
+import ball_model
+import kick_model
+
+# the parameters the server sends for each player type
+PARAMETERS = ("player_speed_max", "stamina_inc_max", "player_decay",
+              "inertia_moment", "dash_power_rate", "player_size",
+              "kickable_margin", "kick_rand", "extra_stamina", "effort_max",
+              "effort_min")
+
+# the server parameters every type's constants are derived from, besides those
+# giving the default type's values.
+SERVER_PARAMETERS = ("ball_size", "player_accel_max") + kick_model.PARAMETERS
+
+# the id of the type every player starts out as
+DEFAULT_TYPE = 0
+
+def default_values(server_parameters):
+    """
+    Returns a dict of the parameters of the default player type, as given by
+    the server parameters.
+    """
+
+    sp = server_parameters
+    return {
+        "player_speed_max": sp.player_speed_max,
+        "stamina_inc_max": sp.stamina_inc_max,
+        "player_decay": sp.player_decay,
+        "inertia_moment": sp.inertia_moment,
+        "dash_power_rate": sp.dash_power_rate,
+        "player_size": sp.player_size,
+        "kickable_margin": sp.kickable_margin,
+        "kick_rand": sp.kick_rand,
+        "extra_stamina": 0.0,
+        "effort_max": sp.effort_init,
+        "effort_min": sp.effort_min,
+    }
+
+class PlayerType:
+    """
+    The parameters of a single heterogeneous player type, along with constants
+    derived from them and the server parameters that are used to predict how
+    players of this type move and kick.
+    """
+
+    def __init__(self, type_id, values, server_parameters, horizon):
+        """
+        type_id: the id the server gave this type.
+        values: a dict with a value for every name in PARAMETERS.
+        server_parameters: the ServerParameters to derive constants with.
+        horizon: how many cycles ahead the reach table looks.
+        """
+
+        self.id = type_id
+
+        self.player_speed_max = values["player_speed_max"]
+        self.stamina_inc_max = values["stamina_inc_max"]
+        self.player_decay = values["player_decay"]
+        self.inertia_moment = values["inertia_moment"]
+        self.dash_power_rate = values["dash_power_rate"]
+        self.player_size = values["player_size"]
+        self.kickable_margin = values["kickable_margin"]
+        self.kick_rand = values["kick_rand"]
+        self.extra_stamina = values["extra_stamina"]
+        self.effort_max = values["effort_max"]
+        self.effort_min = values["effort_min"]
+
+        sp = server_parameters
+
+        # the furthest the ball's center can be from ours and still be kicked
+        self.kickable_area = (self.player_size + sp.ball_size +
+                              self.kickable_margin)
+
+        # the most a full power dash can accelerate us by
+        self.accel_max = min(sp.player_accel_max,
+                sp.maxpower * self.dash_power_rate * self.effort_max)
+
+        # the speed we settle at when dashing at full power, where the
+        # acceleration of each dash makes up for what's lost to decay.
+        self.real_speed_max = min(self.player_speed_max,
+                self.accel_max / (1 - self.player_decay))
+
+        # how far we can run in each number of cycles up to the horizon,
+        # never faster than we can actually keep up.
+        self.reach_table = ball_model.reach_table(self.real_speed_max,
+                self.accel_max, self.player_decay, horizon)
+
+        # types with the same margin share a kick model, which the server
+        # parameters keep until one it's built from changes.
+        kick_models = sp.derived("kick_models")
+        self.kick_model = kick_models.get(self.kickable_margin)
+        if self.kick_model is None:
+            self.kick_model = kick_model.KickModel(sp, self.kickable_margin)
+            kick_models[self.kickable_margin] = self.kick_model
+
+class PlayerTypeTable:
+    """
+    All the player types the server told us about, indexed by id.  Until the
+    server sends the default type, it's made up from the server parameters.
+    """
+
+    def __init__(self, server_parameters, horizon):
+        """
+        Creates a table holding only the default type.
+        """
+
+        self.server_parameters = server_parameters
+        self.horizon = horizon
+
+        # the values of each type by id, or None for those we haven't been sent
+        self.values = [default_values(server_parameters)]
+        self.from_server = [False]
+
+        # the values of SERVER_PARAMETERS the types were last derived from
+        self.inputs = None
+
+        self.types = []
+        self.update()
+
+    def __len__(self):
+        return len(self.types)
+
+    def set_type(self, values):
+        """
+        Adds or replaces a type from a dict of its 'id' and parameters, as
+        sent by the server in a 'player_type' message.  Parameters that are
+        left out take their default values.
+        """
+
+        type_id = values["id"]
+
+        # older servers don't send every parameter
+        merged = default_values(self.server_parameters)
+        merged.update(values)
+        values = merged
+
+        while len(self.values) <= type_id:
+            self.values.append(None)
+            self.from_server.append(False)
+            self.types.append(None)
+
+        self.values[type_id] = values
+        self.from_server[type_id] = True
+        self.types[type_id] = PlayerType(type_id, values,
+                self.server_parameters, self.horizon)
+
+    def update(self):
+        """
+        Rederives the constants of the types that depend on server parameters
+        that have changed.  Nothing is rebuilt if none of them have.
+        """
+
+        sp = self.server_parameters
+
+        inputs = tuple(getattr(sp, name) for name in SERVER_PARAMETERS)
+        if inputs != self.inputs:
+            # every type depends on these
+            self.inputs = inputs
+            rebuild = range(len(self.values))
+        else:
+            rebuild = []
+
+        # the default type only depends on the rest until the server sends it
+        if not self.from_server[DEFAULT_TYPE]:
+            defaults = default_values(sp)
+            if defaults != self.values[DEFAULT_TYPE]:
+                self.values[DEFAULT_TYPE] = defaults
+                if len(rebuild) == 0:
+                    rebuild = [DEFAULT_TYPE]
+
+        while len(self.types) < len(self.values):
+            self.types.append(None)
+
+        for type_id in rebuild:
+            values = self.values[type_id]
+            if values is not None:
+                self.types[type_id] = PlayerType(type_id, values, sp,
+                        self.horizon)
+
+    def get(self, type_id):
+        """
+        Returns the type with the given id, or the default type if it's None
+        or we don't know about it.
+        """
+
+        if type_id is not None and 0 <= type_id < len(self.types):
+            player_type = self.types[type_id]
+            if player_type is not None:
+                return player_type
+
+        return self.types[DEFAULT_TYPE]
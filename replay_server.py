@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+
+import json
+import re
+import socket
+import threading
+import time
+
+import match_recorder
+import message_parser
+
+# finds the synch_mode parameter in a 'server_param' message
+SYNCH_MODE = re.compile(r"\(synch_mode [^)]*\)")
+
+def with_synch_mode(message):
+    """
+    Returns a 'server_param' message with synch_mode turned on, so agents
+    replying to a replay in synchronous mode answer each '(think)' with
+    '(done)'.  Any other message is returned unchanged.
+    """
+
+    if not message.startswith("(server_param "):
+        return message
+
+    if SYNCH_MODE.search(message) is not None:
+        return SYNCH_MODE.sub("(synch_mode 1)", message)
+
+    return message[:-1] + "(synch_mode 1))"
+
+class ReplayClient:
+    """
+    A single connected client, along with the socket we talk to it through and
+    statistics about how it's responding.
+    """
+
+    def __init__(self, client_id, address, teamname, side, uniform_number):
+        self.client_id = client_id
+        self.address = address
+        self.teamname = teamname
+        self.side = side
+        self.uniform_number = uniform_number
+
+        # like the real server, each client gets its own port once connected
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", 0))
+
+        self.messages_sent = 0
+        self.commands_received = 0
+
+        # when we sent the start of the current cycle, and whether the client
+        # replied to it yet.  in synchronous mode only '(done)' is a reply.
+        self.cycle_sent_at = None
+        self.cycle_answered = True
+
+        self.cycles = 0
+        self.cycles_answered = 0
+
+        # seconds between sending each cycle and the client's first reply
+        self.latencies = []
+
+        # set whenever the client says it's done, in synchronous mode
+        self.done = threading.Event()
+
+        # whether we've sent the client the whole recording
+        self.finished = False
+
+    def send(self, msg):
+        """
+        Sends a message to the client, null-terminated like the server does.
+        """
+
+        self.sock.sendto(msg + "\0", self.address)
+        self.messages_sent += 1
+
+    def start_cycle(self):
+        """
+        Notes that we're about to send the client a new cycle.
+        """
+
+        self.cycles += 1
+        self.cycle_sent_at = time.time()
+        self.cycle_answered = False
+
+    def command_received(self, when, reply=True):
+        """
+        Notes that the client sent us a command at the given time, and whether
+        it counts as a reply to the current cycle.
+        """
+
+        self.commands_received += 1
+
+        if (reply and not self.cycle_answered and
+                self.cycle_sent_at is not None):
+            self.cycle_answered = True
+            self.cycles_answered += 1
+            self.latencies.append(when - self.cycle_sent_at)
+
+    def stats(self):
+        """
+        Returns a dict of statistics about this client.
+        """
+
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if len(latencies) == 0:
+                return None
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+
+        mean = None
+        if len(latencies) > 0:
+            mean = sum(latencies) / len(latencies)
+
+        drop_rate = None
+        if self.cycles > 0:
+            drop_rate = 1 - self.cycles_answered / float(self.cycles)
+
+        return {
+            "client": self.client_id,
+            "team": self.teamname,
+            "side": self.side,
+            "uniform_number": self.uniform_number,
+            "messages_sent": self.messages_sent,
+            "commands_received": self.commands_received,
+            "cycles": self.cycles,
+            "cycles_answered": self.cycles_answered,
+            "drop_rate": drop_rate,
+            "latency_mean": mean,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": percentile(1.0),
+        }
+
+class ReplayServer:
+    """
+    A stand-in for the soccer server that accepts clients with the usual init
+    handshake, then streams a recording of server messages back to each of
+    them while recording every command they send.  Used to measure how fast
+    agents respond without needing a real server.
+
+    The recording is the server messages received by a client, read from a
+    text file with one per line or a match_recorder log.  Any 'init' messages
+    in it are skipped, since each client gets its own.  In synchronous mode
+    the recorded 'server_param' is changed to say so, since agents only send
+    '(done)' when they're told the server is synchronous.
+    """
+
+    # how long a real server cycle lasts in seconds
+    CYCLE_LENGTH = 0.1
+
+    def __init__(self, port, recording, speed=1.0, synch=False,
+            synch_timeout=1.0, command_log=None):
+        """
+        port: the port to accept clients on.
+        recording: the list of server messages to replay.
+        speed: how many times faster than real time to replay, or 0 to replay
+            as fast as possible.
+        synch: whether to send '(think)' at the end of every cycle and wait for
+            the client's '(done)' before moving on, like the server does in
+            synchronous mode.
+        synch_timeout: seconds to wait for a client's '(done)'.
+        command_log: a file to record all received commands to, or None.
+        """
+
+        self.recording = [l for l in recording if not l.startswith("(init")]
+        if synch:
+            self.recording = [with_synch_mode(l) for l in self.recording]
+        self.speed = speed
+        self.synch = synch
+        self.synch_timeout = synch_timeout
+        self.command_log = command_log
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", port))
+
+        self.clients = []
+        self.teams = []
+        self.lock = threading.Lock()
+
+        self.start_time = time.time()
+
+    def accept(self, num_clients):
+        """
+        Waits for the given number of clients to connect, starting to replay
+        to each as soon as it does.
+        """
+
+        while len(self.clients) < num_clients:
+            data, address = self.sock.recvfrom(8192)
+            data = data.strip("\0")
+
+            if not data.startswith("(init "):
+                continue
+
+            client = self._add_client(data, address)
+            client.send("(init %s %d before_kick_off)" % (client.side,
+                client.uniform_number))
+
+            for target in (self._receive_loop, self._replay_loop):
+                t = threading.Thread(target=target, args=(client,))
+                t.daemon = True
+                t.start()
+
+    def _add_client(self, init_msg, address):
+        """
+        Creates a client for an init message, putting the first team to
+        connect on the left side and the second on the right.
+        """
+
+        teamname = init_msg.split()[1]
+        if teamname not in self.teams:
+            self.teams.append(teamname)
+
+        side = "l"
+        if self.teams.index(teamname) % 2 == 1:
+            side = "r"
+
+        uniform_number = len([c for c in self.clients
+                              if c.teamname == teamname]) + 1
+
+        client = ReplayClient(len(self.clients), address, teamname, side,
+                uniform_number)
+        self.clients.append(client)
+
+        return client
+
+    def _receive_loop(self, client):
+        """
+        Records every command the client sends us.
+        """
+
+        while 1:
+            data = client.sock.recv(8192)
+            now = time.time()
+
+            # a datagram may hold more than one command
+            commands = message_parser.split(data)
+            for command in commands:
+                done = command == "(done)"
+                client.command_received(now, done or not self.synch)
+
+                if done:
+                    client.done.set()
+
+                if self.command_log is not None:
+                    with self.lock:
+                        self.command_log.write("%.6f %d %s\n" %
+                                (now - self.start_time, client.client_id,
+                                 command))
+
+    def _replay_loop(self, client):
+        """
+        Sends the recording to the client, pacing each cycle's messages
+        according to the replay speed.
+        """
+
+        interval = 0
+        if self.speed > 0:
+            interval = ReplayServer.CYCLE_LENGTH / self.speed
+
+        next_cycle = time.time()
+        for i, line in enumerate(self.recording):
+            if match_recorder.message_cycle(line) is not None:
+                # wait until it's time for the next cycle
+                delay = next_cycle - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                next_cycle = max(next_cycle + interval, time.time())
+
+                client.start_cycle()
+
+            client.send(line)
+
+            # in synchronous mode the cycle ends when the next one starts, and
+            # we can't go on until the client says it's done with this one.
+            if self.synch:
+                at_end = i + 1 == len(self.recording)
+                if at_end or match_recorder.message_cycle(
+                        self.recording[i + 1]) is not None:
+                    client.done.clear()
+                    client.send("(think)")
+                    client.done.wait(self.synch_timeout)
+
+        client.finished = True
+
+    def wait(self, timeout=None):
+        """
+        Waits until the recording has been replayed to every client, or the
+        timeout in seconds runs out.
+        """
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while not all(c.finished for c in self.clients):
+            if deadline is not None and time.time() > deadline:
+                break
+            time.sleep(0.01)
+
+    def report(self):
+        """
+        Returns a dict with statistics for every client and all of them
+        together.
+        """
+
+        clients = [c.stats() for c in self.clients]
+
+        latencies = []
+        for c in self.clients:
+            latencies.extend(c.latencies)
+        latencies.sort()
+
+        cycles = sum(c.cycles for c in self.clients)
+        answered = sum(c.cycles_answered for c in self.clients)
+        elapsed = time.time() - self.start_time
+
+        summary = {
+            "clients": len(self.clients),
+            "elapsed": elapsed,
+            "messages_sent": sum(c.messages_sent for c in self.clients),
+            "commands_received": sum(c.commands_received
+                                     for c in self.clients),
+            "cycles": cycles,
+            "cycles_per_second": cycles / elapsed if elapsed > 0 else None,
+            "drop_rate": 1 - answered / float(cycles) if cycles > 0 else None,
+            "latency_mean": (sum(latencies) / len(latencies)
+                             if len(latencies) > 0 else None),
+            "latency_max": latencies[-1] if len(latencies) > 0 else None,
+        }
+
+        return {"clients": clients, "summary": summary}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded server "
+            "messages to connecting agents and measure how they respond.")
+    parser.add_argument("recording", help="file of recorded server messages, "
+            "either one per line (eg. client_recv) or a match_recorder log")
+    parser.add_argument("--port", type=int, default=6000,
+            help="port to accept clients on")
+    parser.add_argument("--clients", type=int, default=1,
+            help="number of clients to wait for")
+    parser.add_argument("--speed", type=float, default=1.0,
+            help="replay speed relative to real time, 0 for as fast as "
+            "possible")
+    parser.add_argument("--synch", action="store_true",
+            help="send (think) every cycle and wait for (done), like the "
+            "server's synchronous mode")
+    parser.add_argument("--synch-timeout", type=float, default=1.0,
+            help="seconds to wait for a client's (done)")
+    parser.add_argument("--record", default=None,
+            help="file to record received commands to")
+    parser.add_argument("--timeout", type=float, default=None,
+            help="seconds to wait for the replay to finish")
+    parser.add_argument("--output", default=None,
+            help="file to write the JSON report to, instead of stdout")
+    options = parser.parse_args()
+
+    recording = list(match_recorder.iter_log_messages(options.recording))
+
+    command_log = None
+    if options.record is not None:
+        command_log = open(options.record, "w")
+
+    server = ReplayServer(options.port, recording, options.speed,
+            options.synch, options.synch_timeout, command_log)
+
+    try:
+        server.accept(options.clients)
+        server.wait(options.timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if command_log is not None:
+            command_log.close()
+
+    report = server.report()
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print json.dumps(report, indent=2)
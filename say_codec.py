@@ -0,0 +1,116 @@
+import collections
+
+# characters the server lets us say, ie. those that can't be confused with the
+# rest of a message.  each character of a message is a digit in this base.
+ALPHABET = ("0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+            "-.+*/?<>_")
+BASE = len(ALPHABET)
+
+# maps each character to its value as a digit
+DIGITS = dict((c, i) for i, c in enumerate(ALPHABET))
+
+# the first character of a message says what it's about
+BALL_TAG = "b"
+
+# how many digits follow the tag, which fits the default say_msg_size of 10
+PAYLOAD_SIZE = 9
+
+# cycle stamps are sent modulo this, which is plenty to tell how old a message
+# is since they're only heard a cycle after being said.
+CYCLE_MOD = 64
+
+# the (low, high, step) range and precision of every value in a ball report,
+# in the order they're packed: ball x and y, ball velocity, and sender x and y.
+BALL_FIELDS = (
+    (-57.5, 57.5, 0.1),
+    (-39.0, 39.0, 0.1),
+    (-3.0, 3.0, 0.05),
+    (-3.0, 3.0, 0.05),
+    (-57.5, 57.5, 0.5),
+    (-39.0, 39.0, 0.5),
+)
+
+# how many distinct values each field can take
+BALL_LEVELS = [int(round((high - low) / step)) + 1
+               for low, high, step in BALL_FIELDS]
+
+# what a teammate told us about the ball
+BallReport = collections.namedtuple("BallReport",
+        "cycle ball_position ball_velocity sender_position")
+
+def _to_digits(n, size):
+    """
+    Returns the number n written with 'size' digits of our alphabet, most
+    significant first.
+    """
+
+    digits = []
+    for i in xrange(size):
+        n, d = divmod(n, BASE)
+        digits.append(ALPHABET[d])
+
+    digits.reverse()
+    return "".join(digits)
+
+def _from_digits(text):
+    """
+    Returns the number written in our alphabet by some text, or None if it has
+    characters that aren't in it.
+    """
+
+    n = 0
+    for c in text:
+        d = DIGITS.get(c)
+        if d is None:
+            return None
+        n = n * BASE + d
+
+    return n
+
+def encode_ball(cycle, ball_position, ball_velocity, sender_position):
+    """
+    Returns a message reporting the ball's absolute position and velocity and
+    the sender's absolute position as of the given cycle.  Values are clamped
+    to their field's range and rounded to its precision.
+    """
+
+    values = (ball_position[0], ball_position[1], ball_velocity[0],
+              ball_velocity[1], sender_position[0], sender_position[1])
+
+    # pack every value into a single mixed-radix number, cycle first
+    n = cycle % CYCLE_MOD
+    for value, (low, high, step), levels in zip(values, BALL_FIELDS,
+            BALL_LEVELS):
+        value = min(max(value, low), high)
+        n = n * levels + int(round((value - low) / step))
+
+    return BALL_TAG + _to_digits(n, PAYLOAD_SIZE)
+
+def decode(message, cycle=None):
+    """
+    Returns the BallReport in a message, or None if it isn't one.  If we know
+    the cycle it was heard in, the report's cycle is restored to the latest
+    one no later than that, otherwise it's left modulo CYCLE_MOD.
+    """
+
+    if (not isinstance(message, basestring) or
+            len(message) != PAYLOAD_SIZE + 1 or message[0] != BALL_TAG):
+        return None
+
+    n = _from_digits(message[1:])
+    if n is None:
+        return None
+
+    # unpack the values in the opposite order they were packed in
+    values = []
+    for (low, high, step), levels in reversed(zip(BALL_FIELDS, BALL_LEVELS)):
+        n, level = divmod(n, levels)
+        values.append(round(low + level * step, 2))
+    values.reverse()
+
+    stamp = n % CYCLE_MOD
+    if cycle is not None:
+        stamp = cycle - (cycle - stamp) % CYCLE_MOD
+
+    return BallReport(stamp, (values[0], values[1]), (values[2], values[3]),
+            (values[4], values[5]))
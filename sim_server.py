@@ -0,0 +1,696 @@
+#!/usr/bin/env python
+
+import json
+import math
+import select
+import socket
+import time
+
+import message_parser
+import landmarks
+from world_model import WorldModel, ServerParameters
+
+def normalize_angle(angle):
+    """
+    Returns the given angle in degrees normalized to [-180, 180).
+    """
+
+    return (angle + 180) % 360 - 180
+
+class SimObject:
+    """
+    Something that moves around the field.  Like the server, we keep positions,
+    velocities, and directions with the y-axis pointing at the bottom of the
+    field and angles increasing clockwise.
+    """
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = x
+        self.y = y
+        self.vx = 0.0
+        self.vy = 0.0
+
+        # acceleration gathered from this cycle's commands
+        self.ax = 0.0
+        self.ay = 0.0
+
+    def accelerate(self, amount, direction, accel_max):
+        """
+        Adds acceleration of the given amount in the given absolute direction,
+        limiting the total to 'accel_max'.
+        """
+
+        rad = math.radians(direction)
+        self.ax += amount * math.cos(rad)
+        self.ay += amount * math.sin(rad)
+
+        accel = math.hypot(self.ax, self.ay)
+        if accel > accel_max:
+            self.ax *= accel_max / accel
+            self.ay *= accel_max / accel
+
+    def step(self, speed_max, decay):
+        """
+        Moves the object for a single cycle: accelerates it, limits its speed,
+        moves it, and then slows it down.
+        """
+
+        self.vx += self.ax
+        self.vy += self.ay
+        self.ax = 0.0
+        self.ay = 0.0
+
+        speed = math.hypot(self.vx, self.vy)
+        if speed > speed_max:
+            self.vx *= speed_max / speed
+            self.vy *= speed_max / speed
+
+        self.x += self.vx
+        self.y += self.vy
+
+        self.vx *= decay
+        self.vy *= decay
+
+class SimPlayer(SimObject):
+    """
+    A connected client and the player it controls.
+    """
+
+    def __init__(self, address, teamname, side, uniform_number, params):
+        SimObject.__init__(self)
+
+        self.address = address
+        self.teamname = teamname
+        self.side = side
+        self.uniform_number = uniform_number
+
+        # line players up just outside the touchline in their own half, like
+        # the server does, until they move themselves
+        self.x = -3.0 * uniform_number
+        self.y = -37.0
+        if side == WorldModel.SIDE_R:
+            self.x = -self.x
+
+        self.body = 0.0
+        self.neck = 0.0
+        if side == WorldModel.SIDE_R:
+            self.body = 180.0
+
+        self.stamina = float(params.stamina_max)
+        self.effort = float(params.effort_init)
+        self.recovery = float(params.recover_init)
+
+        # each client gets its own port once connected, like the real server
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", 0))
+
+        # the primary, neck, and say commands received during this cycle
+        self.primary = None
+        self.turn_neck = None
+        self.say = None
+
+        # whether the client said it's done with this cycle, in synch mode
+        self.done = False
+
+        # counts of each executed command, as reported in sense_body
+        self.counts = dict((c, 0) for c in
+                ("kick", "dash", "turn", "turn_neck", "move", "say"))
+
+        self.commands_received = 0
+        self.cycles_missed = 0
+        self.done_latencies = []
+
+    def send(self, msg):
+        """
+        Sends a null-terminated message to the client.
+        """
+
+        self.sock.sendto(msg + "\0", self.address)
+
+    def face(self):
+        """
+        Returns the absolute direction the player's head is facing.
+        """
+
+        return self.body + self.neck
+
+class SimServer:
+    """
+    A small stand-in for the soccer server that simulates its core physics, so
+    agents can be run closed-loop without one.  Players can dash, turn, kick,
+    move, and turn their neck, and are told about the world with 'see' and
+    'sense_body' messages in the server's format.  The simulation can run
+    faster than real time, or in synchronous mode as fast as the agents can
+    keep up.
+
+    Simulation is noise-free and leaves out collisions, catching, tackling,
+    and most referee decisions, so runs are repeatable.  Balls going out of
+    bounds are dropped back onto the field.  Players hear everything said
+    within earshot, however much is said at once.
+    """
+
+    # how long a real server cycle lasts in seconds
+    CYCLE_LENGTH = 0.1
+
+    # play modes in which players may move themselves anywhere
+    MOVE_MODES = (WorldModel.PlayModes.BEFORE_KICK_OFF,
+                  WorldModel.PlayModes.KICK_OFF_L,
+                  WorldModel.PlayModes.KICK_OFF_R)
+
+    def __init__(self, port, num_clients=1, speed=1.0, synch=False,
+            synch_timeout=1.0, kick_off_cycle=10, cycles=6000):
+        """
+        port: the port to accept clients on.
+        num_clients: how many clients must connect before time starts.
+        speed: how many times faster than real time to run when not in
+            synchronous mode, or 0 to run as fast as possible.
+        synch: whether to wait for every client's '(done)' at the end of each
+            cycle, like the server does in synchronous mode.
+        synch_timeout: seconds to wait for clients to be done with a cycle.
+        kick_off_cycle: the cycle at which the left side kicks off.
+        cycles: how many cycles to play before time is over.
+        """
+
+        self.num_clients = num_clients
+        self.speed = speed
+        self.synch = synch
+        self.synch_timeout = synch_timeout
+        self.kick_off_cycle = kick_off_cycle
+        self.cycles = cycles
+
+        self.params = ServerParameters()
+        self.params.synch_mode = int(synch)
+
+        self.landmarks = landmarks.LandmarkTable(self.params.goal_width)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", port))
+
+        self.players = []
+        self.teams = []
+
+        self.ball = SimObject()
+
+        self.cycle = 0
+        self.play_mode = WorldModel.PlayModes.BEFORE_KICK_OFF
+        self.score_l = 0
+        self.score_r = 0
+
+        self.start_time = None
+        self.cycle_start = None
+
+    def run(self):
+        """
+        Waits for all clients to connect, then plays until time is over.
+        """
+
+        while len(self.players) < self.num_clients:
+            self._receive(None)
+
+        self.start_time = time.time()
+
+        interval = 0
+        if self.speed > 0:
+            interval = SimServer.CYCLE_LENGTH / self.speed
+
+        next_cycle = self.start_time
+        while self.cycle < self.cycles:
+            self.cycle_start = time.time()
+            self._send_perceptions()
+
+            # gather commands until the cycle is over
+            if self.synch:
+                for p in self.players:
+                    p.done = False
+                    p.send("(think)")
+
+                deadline = time.time() + self.synch_timeout
+                while (not all(p.done for p in self.players) and
+                        time.time() < deadline):
+                    self._receive(deadline - time.time())
+            else:
+                next_cycle += interval
+                while 1:
+                    self._receive(max(next_cycle - time.time(), 0))
+                    if time.time() >= next_cycle:
+                        break
+
+            self._step()
+
+        self._referee(WorldModel.PlayModes.TIME_OVER)
+
+    def _receive(self, timeout):
+        """
+        Handles every datagram that arrives before the timeout in seconds runs
+        out, or just the first to arrive if the timeout is None.
+        """
+
+        socks = [self.sock] + [p.sock for p in self.players]
+        readable, _, _ = select.select(socks, [], [], timeout)
+
+        for sock in readable:
+            data, address = sock.recvfrom(8192)
+
+            if sock is self.sock:
+                self._connect(data.strip("\0"), address)
+                continue
+
+            player = [p for p in self.players if p.sock is sock][0]
+
+            # a datagram may hold more than one command
+            for command in message_parser.split(data):
+                self._command(player, message_parser.parse(command))
+
+    def _connect(self, init_msg, address):
+        """
+        Adds a player for a client's init message, putting the first team to
+        connect on the left side and the second on the right.
+        """
+
+        msg = message_parser.parse(init_msg)
+        if msg[0] != "init" or len(self.players) >= 22:
+            return
+
+        teamname = msg[1]
+        if teamname not in self.teams:
+            self.teams.append(teamname)
+
+        side = WorldModel.SIDE_L
+        if self.teams.index(teamname) % 2 == 1:
+            side = WorldModel.SIDE_R
+
+        uniform_number = len([p for p in self.players
+                              if p.teamname == teamname]) + 1
+
+        player = SimPlayer(address, teamname, side, uniform_number,
+                self.params)
+        self.players.append(player)
+
+        player.send("(init %s %d %s)" % (side, uniform_number, self.play_mode))
+
+        # only send numeric parameters, which are all the simulation uses
+        values = []
+        for key, default in ServerParameters.DEFAULTS:
+            value = getattr(self.params, key)
+            if isinstance(value, (int, float)):
+                values.append("(%s %s)" % (key, value))
+        player.send("(server_param %s)" % "".join(values))
+
+    def _command(self, player, cmd):
+        """
+        Stores a command from a player until the end of the cycle.  Only the
+        last primary command sent during a cycle is executed.
+        """
+
+        player.commands_received += 1
+
+        if cmd[0] == "done":
+            if not player.done:
+                player.done = True
+                player.done_latencies.append(time.time() - self.cycle_start)
+        elif cmd[0] == "turn_neck":
+            player.turn_neck = cmd[1]
+        elif cmd[0] == "say":
+            player.say = str(cmd[1])
+        elif cmd[0] in ("dash", "turn", "kick", "move"):
+            player.primary = cmd
+
+    def _step(self):
+        """
+        Executes every player's commands and moves everything on by a cycle.
+        """
+
+        p = self.params
+
+        for player in self.players:
+            if player.primary is None:
+                player.cycles_missed += 1
+            else:
+                self._execute(player, player.primary)
+                player.counts[player.primary[0]] += 1
+
+            if player.turn_neck is not None:
+                moment = min(max(player.turn_neck, p.minneckmoment),
+                        p.maxneckmoment)
+                player.neck = min(max(player.neck + moment, p.minneckang),
+                        p.maxneckang)
+                player.counts["turn_neck"] += 1
+
+            player.primary = None
+            player.turn_neck = None
+
+        for player in self.players:
+            player.step(p.player_speed_max, p.player_decay)
+            self._recover(player)
+
+        self.ball.step(p.ball_speed_max, p.ball_decay)
+
+        self.cycle += 1
+
+        self._deliver_says()
+
+        if self.cycle == self.kick_off_cycle:
+            self._referee(WorldModel.PlayModes.KICK_OFF_L)
+
+        self._check_ball()
+
+    def _deliver_says(self):
+        """
+        Lets every player hear what was said last cycle by those within
+        audio_cut_dist of it.
+        """
+
+        speakers = [p for p in self.players if p.say is not None]
+
+        for speaker in speakers:
+            speaker.counts["say"] += 1
+
+            for listener in self.players:
+                if listener is speaker:
+                    continue
+
+                dx = speaker.x - listener.x
+                dy = speaker.y - listener.y
+                if math.hypot(dx, dy) > self.params.audio_cut_dist:
+                    continue
+
+                direction = normalize_angle(math.degrees(math.atan2(dy, dx)) -
+                        listener.face())
+
+                if listener.teamname == speaker.teamname:
+                    listener.send('(hear %d %.0f our %d "%s")' % (self.cycle,
+                        direction, speaker.uniform_number, speaker.say))
+                else:
+                    listener.send('(hear %d %.0f opp "%s")' % (self.cycle,
+                        direction, speaker.say))
+
+        for speaker in speakers:
+            speaker.say = None
+
+    def _execute(self, player, cmd):
+        """
+        Carries out a player's primary command.
+        """
+
+        p = self.params
+        name = cmd[0]
+
+        if name == "dash":
+            power = min(max(cmd[1], p.minpower), p.maxpower)
+
+            # dashing backwards costs twice as much, and we can't spend
+            # stamina we don't have.
+            cost = power
+            if power < 0:
+                cost = -2 * power
+            if cost > player.stamina:
+                power *= player.stamina / cost
+                cost = player.stamina
+            player.stamina -= cost
+
+            player.accelerate(power * player.effort * p.dash_power_rate,
+                    player.body, p.player_accel_max)
+
+        elif name == "turn":
+            moment = min(max(cmd[1], p.minmoment), p.maxmoment)
+            speed = math.hypot(player.vx, player.vy)
+            moment /= 1.0 + p.inertia_moment * speed
+            player.body = normalize_angle(player.body + moment)
+
+        elif name == "kick":
+            if self.play_mode == WorldModel.PlayModes.BEFORE_KICK_OFF:
+                return
+
+            dx = self.ball.x - player.x
+            dy = self.ball.y - player.y
+            dist = math.hypot(dx, dy) - p.player_size - p.ball_size
+            if dist > p.kickable_margin:
+                return
+
+            # kicks are weaker the further the ball is and the more it's
+            # behind us (formula 4.21 in the documentation).
+            dir_diff = abs(normalize_angle(math.degrees(math.atan2(dy, dx)) -
+                                           player.body))
+            factor = (1 - 0.25 * dir_diff / 180.0 -
+                      0.25 * max(dist, 0) / p.kickable_margin)
+
+            power = min(max(cmd[1], p.minpower), p.maxpower)
+            direction = min(max(cmd[2], p.minmoment), p.maxmoment)
+            self.ball.accelerate(power * p.kick_power_rate * factor,
+                    player.body + direction, p.ball_accel_max)
+
+            if self.play_mode != WorldModel.PlayModes.PLAY_ON:
+                self._referee(WorldModel.PlayModes.PLAY_ON)
+
+        elif name == "move":
+            if self.play_mode not in SimServer.MOVE_MODES:
+                return
+
+            # the right side sees the field the other way around
+            x, y = cmd[1], cmd[2]
+            if player.side == WorldModel.SIDE_R:
+                x, y = -x, -y
+
+            player.x = x
+            player.y = y
+            player.vx = 0.0
+            player.vy = 0.0
+
+    def _recover(self, player):
+        """
+        Recovers a player's stamina, and updates its effort and recovery rates.
+        """
+
+        p = self.params
+
+        if player.stamina <= p.recover_dec_thr * p.stamina_max:
+            player.recovery = max(player.recovery - p.recover_dec,
+                    p.recover_min)
+
+        if player.stamina <= p.effort_dec_thr * p.stamina_max:
+            player.effort = max(player.effort - p.effort_dec, p.effort_min)
+        elif player.stamina >= p.effort_inc_thr * p.stamina_max:
+            player.effort = min(player.effort + p.effort_inc, 1.0)
+
+        player.stamina = min(player.stamina +
+                player.recovery * p.stamina_inc_max, p.stamina_max)
+
+    def _check_ball(self):
+        """
+        Awards goals and drops the ball back onto the field when it leaves it.
+        """
+
+        half_length = landmarks.PITCH_LENGTH / 2
+        half_width = landmarks.PITCH_WIDTH / 2
+        ball = self.ball
+
+        if abs(ball.x) <= half_length and abs(ball.y) <= half_width:
+            return
+
+        goal_y = self.params.goal_width / 2
+        if abs(ball.x) > half_length and abs(ball.y) < goal_y:
+            if ball.x > 0:
+                self.score_l += 1
+                self._referee("%s%d" % (WorldModel.RefereeMessages.GOAL_L,
+                        self.score_l))
+                kick_off = WorldModel.PlayModes.KICK_OFF_R
+            else:
+                self.score_r += 1
+                self._referee("%s%d" % (WorldModel.RefereeMessages.GOAL_R,
+                        self.score_r))
+                kick_off = WorldModel.PlayModes.KICK_OFF_L
+
+            ball.x, ball.y = 0.0, 0.0
+            self._referee(kick_off)
+        else:
+            ball.x = min(max(ball.x, -half_length), half_length)
+            ball.y = min(max(ball.y, -half_width), half_width)
+            self._referee(WorldModel.PlayModes.DROP_BALL)
+            self._referee(WorldModel.PlayModes.PLAY_ON)
+
+        ball.vx = 0.0
+        ball.vy = 0.0
+
+    def _referee(self, message):
+        """
+        Announces a referee message to every player, changing the play mode if
+        it names one.
+        """
+
+        if not message.startswith("goal_"):
+            self.play_mode = message
+
+        for player in self.players:
+            player.send("(hear %d referee %s)" % (self.cycle, message))
+
+    def _send_perceptions(self):
+        """
+        Sends every player what it senses of its body and sees this cycle.
+        """
+
+        for player in self.players:
+            player.send(self._sense_body(player))
+            player.send(self._see(player))
+
+    def _sense_body(self, player):
+        """
+        Returns a player's 'sense_body' message.
+        """
+
+        speed = math.hypot(player.vx, player.vy)
+        speed_dir = 0.0
+        if speed > 0:
+            speed_dir = normalize_angle(math.degrees(math.atan2(player.vy,
+                player.vx)) - player.face())
+
+        c = player.counts
+        return ("(sense_body %d (view_mode high normal) (stamina %.0f %g) "
+                "(speed %.2f %.0f) (head_angle %.0f) (kick %d) (dash %d) "
+                "(turn %d) (say %d) (turn_neck %d) (catch 0) (move %d) "
+                "(change_view 0))" % (self.cycle, player.stamina,
+                    player.effort, speed, speed_dir, player.neck, c["kick"],
+                    c["dash"], c["turn"], c["say"], c["turn_neck"],
+                    c["move"]))
+
+    def _see(self, player):
+        """
+        Returns a player's 'see' message, describing every landmark, the ball,
+        and every other player within its view.
+        """
+
+        half_angle = self.params.visible_angle / 2.0
+        face = player.face()
+
+        def relative(x, y):
+            dx = x - player.x
+            dy = y - player.y
+            dist = math.hypot(dx, dy)
+            direction = normalize_angle(math.degrees(math.atan2(dy, dx)) -
+                    face)
+            return (dx, dy, dist, direction)
+
+        def changes(obj, dx, dy, dist):
+            # how fast the object is moving away and across our line of sight
+            if dist == 0:
+                return (0.0, 0.0)
+            rvx = obj.vx - player.vx
+            rvy = obj.vy - player.vy
+            ex = dx / dist
+            ey = dy / dist
+            dist_chg = rvx * ex + rvy * ey
+            dir_chg = math.degrees((rvy * ex - rvx * ey) / dist)
+            return (dist_chg, dir_chg)
+
+        objects = []
+
+        # landmark coordinates have the y-axis pointing at the top of the field
+        lm = self.landmarks
+        for i in xrange(len(lm)):
+            dx, dy, dist, direction = relative(lm.xs[i], -lm.ys[i])
+            if abs(direction) <= half_angle:
+                name = " ".join(str(n) for n in lm.names[i])
+                objects.append("((%s) %.1f %.0f)" % (name, dist, direction))
+
+        dx, dy, dist, direction = relative(self.ball.x, self.ball.y)
+        if abs(direction) <= half_angle:
+            dist_chg, dir_chg = changes(self.ball, dx, dy, dist)
+            objects.append("((b) %.1f %.0f %.2f %.1f)" % (dist, direction,
+                dist_chg, dir_chg))
+
+        for other in self.players:
+            if other is player:
+                continue
+
+            dx, dy, dist, direction = relative(other.x, other.y)
+            if abs(direction) <= half_angle:
+                dist_chg, dir_chg = changes(other, dx, dy, dist)
+                objects.append('((p "%s" %d) %.1f %.0f %.2f %.1f %.0f %.0f)' %
+                        (other.teamname, other.uniform_number, dist,
+                         direction, dist_chg, dir_chg,
+                         normalize_angle(other.body - face),
+                         normalize_angle(other.face() - face)))
+
+        return "(see %d %s)" % (self.cycle, " ".join(objects))
+
+    def report(self):
+        """
+        Returns a dict with statistics about the run and every client.
+        """
+
+        elapsed = 0.0
+        if self.start_time is not None:
+            elapsed = time.time() - self.start_time
+
+        clients = []
+        latencies = []
+        for p in self.players:
+            latencies.extend(p.done_latencies)
+
+            mean = None
+            if len(p.done_latencies) > 0:
+                mean = sum(p.done_latencies) / len(p.done_latencies)
+
+            clients.append({
+                "team": p.teamname,
+                "side": p.side,
+                "uniform_number": p.uniform_number,
+                "commands_received": p.commands_received,
+                "cycles_missed": p.cycles_missed,
+                "done_latency_mean": mean,
+                "done_latency_max": max(p.done_latencies or [None]),
+            })
+
+        summary = {
+            "clients": len(self.players),
+            "cycles": self.cycle,
+            "elapsed": elapsed,
+            "cycles_per_second": self.cycle / elapsed if elapsed > 0 else None,
+            "score_l": self.score_l,
+            "score_r": self.score_r,
+            "cycles_missed": sum(p.cycles_missed for p in self.players),
+            "done_latency_mean": (sum(latencies) / len(latencies)
+                                  if len(latencies) > 0 else None),
+            "done_latency_max": max(latencies or [None]),
+        }
+
+        return {"clients": clients, "summary": summary}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate a match for "
+            "connecting agents and measure how they respond.")
+    parser.add_argument("--port", type=int, default=6000,
+            help="port to accept clients on")
+    parser.add_argument("--clients", type=int, default=1,
+            help="number of clients to wait for before starting")
+    parser.add_argument("--speed", type=float, default=1.0,
+            help="speed relative to real time, 0 for as fast as possible")
+    parser.add_argument("--synch", action="store_true",
+            help="wait for every client's (done) each cycle, like the "
+            "server's synchronous mode")
+    parser.add_argument("--synch-timeout", type=float, default=1.0,
+            help="seconds to wait for clients to be done with a cycle")
+    parser.add_argument("--kick-off", type=int, default=10,
+            help="cycle at which the left side kicks off")
+    parser.add_argument("--cycles", type=int, default=6000,
+            help="number of cycles to play")
+    parser.add_argument("--output", default=None,
+            help="file to write the JSON report to, instead of stdout")
+    options = parser.parse_args()
+
+    server = SimServer(options.port, options.clients, options.speed,
+            options.synch, options.synch_timeout, options.kick_off,
+            options.cycles)
+
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
+    report = server.report()
+    if options.output is not None:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print json.dumps(report, indent=2)
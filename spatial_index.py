@@ -0,0 +1,200 @@
+import math
+
+class SpatialGrid:
+    """
+    A uniform grid over the field that buckets items by their absolute
+    coordinates, allowing nearest-neighbour, radius, and cone queries to only
+    look at the cells near the point of interest instead of every item.
+
+    Every item is stored alongside its coordinates and the side of the field it
+    belongs to, so queries can be restricted to teammates or opponents.
+    Points outside the field are kept in the nearest edge cell.
+    """
+
+    def __init__(self, width=120, height=80, cell_size=10.0):
+        """
+        width, height: dimensions of the area covered by the grid, centered on
+            the origin.
+        cell_size: length of the side of each square grid cell.
+        """
+
+        self.cell_size = float(cell_size)
+        self.min_x = -width / 2.0
+        self.min_y = -height / 2.0
+
+        self.cols = int(math.ceil(width / self.cell_size))
+        self.rows = int(math.ceil(height / self.cell_size))
+
+        # one list of (x, y, side, item) entries per cell, stored row-major
+        self.cells = [[] for i in xrange(self.cols * self.rows)]
+
+        # indexes of the cells that currently contain something, so clearing
+        # doesn't have to touch the empty ones.
+        self.used_cells = set([])
+
+        self.size = 0
+
+    def clear(self):
+        """
+        Removes all items from the grid, keeping the cell lists for reuse.
+        """
+
+        for i in self.used_cells:
+            del self.cells[i][:]
+
+        self.used_cells.clear()
+        self.size = 0
+
+    def _cell_coords(self, x, y):
+        """
+        Returns the (column, row) of the cell containing the given point.
+        """
+
+        col = int((x - self.min_x) / self.cell_size)
+        row = int((y - self.min_y) / self.cell_size)
+
+        # clamp points off the edges of the grid into the edge cells
+        col = min(max(col, 0), self.cols - 1)
+        row = min(max(row, 0), self.rows - 1)
+
+        return col, row
+
+    def insert(self, item, point, side=None):
+        """
+        Adds an item at the given (x, y) point, belonging to the given side.
+        """
+
+        x, y = point
+        col, row = self._cell_coords(x, y)
+        i = row * self.cols + col
+
+        self.cells[i].append((x, y, side, item))
+        self.used_cells.add(i)
+        self.size += 1
+
+    def _ring(self, col, row, radius):
+        """
+        Yields the cell lists at exactly 'radius' cells away (in the chessboard
+        sense) from the given cell, skipping those outside the grid.
+        """
+
+        cols = self.cols
+        rows = self.rows
+
+        for r in xrange(row - radius, row + radius + 1):
+            if r < 0 or r >= rows:
+                continue
+
+            # whole rows on the top and bottom edges of the ring, only the end
+            # cells for the rows in between.
+            if r == row - radius or r == row + radius:
+                cs = xrange(col - radius, col + radius + 1)
+            else:
+                cs = (col - radius, col + radius)
+
+            for c in cs:
+                if 0 <= c < cols:
+                    yield self.cells[r * cols + c]
+
+    def _cells_in_box(self, min_x, min_y, max_x, max_y):
+        """
+        Yields the cell lists overlapping the given bounding box.
+        """
+
+        c1, r1 = self._cell_coords(min_x, min_y)
+        c2, r2 = self._cell_coords(max_x, max_y)
+
+        for r in xrange(r1, r2 + 1):
+            for c in xrange(c1, c2 + 1):
+                yield self.cells[r * self.cols + c]
+
+    def nearest(self, point, k=1, side=None):
+        """
+        Returns a list of up to 'k' (distance, item) tuples for the items
+        nearest to the given point, nearest first.  If 'side' is given, only
+        items on that side are considered.
+        """
+
+        if self.size == 0 or k <= 0:
+            return []
+
+        px, py = point
+        col, row = self._cell_coords(px, py)
+
+        found = []
+        max_radius = max(self.cols, self.rows)
+        for radius in xrange(max_radius):
+            for cell in self._ring(col, row, radius):
+                for x, y, s, item in cell:
+                    if side is not None and s != side:
+                        continue
+
+                    d = math.sqrt((x - px) ** 2 + (y - py) ** 2)
+                    found.append((d, item))
+
+            # anything in a ring further out than this one is at least this far
+            # away, so we can stop once we have enough items nearer than that.
+            if len(found) >= k:
+                found.sort(key=lambda f: f[0])
+                if found[k - 1][0] <= radius * self.cell_size:
+                    break
+
+        found.sort(key=lambda f: f[0])
+        return found[:k]
+
+    def _entries_within(self, point, radius, side=None):
+        """
+        Yields (distance, x, y, item) tuples for all items within the given
+        radius of the point, in no particular order.
+        """
+
+        px, py = point
+
+        for cell in self._cells_in_box(px - radius, py - radius,
+                px + radius, py + radius):
+            for x, y, s, item in cell:
+                if side is not None and s != side:
+                    continue
+
+                d = math.sqrt((x - px) ** 2 + (y - py) ** 2)
+                if d <= radius:
+                    yield d, x, y, item
+
+    def within_radius(self, point, radius, side=None):
+        """
+        Returns a list of (distance, item) tuples for all items within the given
+        radius of the point, nearest first.
+        """
+
+        found = [(d, item) for d, x, y, item in
+                 self._entries_within(point, radius, side)]
+
+        found.sort(key=lambda f: f[0])
+        return found
+
+    def within_cone(self, apex, direction, half_angle, max_dist, side=None):
+        """
+        Returns a list of (distance, item) tuples for all items inside the cone
+        starting at 'apex' pointing in the absolute 'direction' (in degrees),
+        spanning 'half_angle' degrees to either side and 'max_dist' long.
+        Nearest items come first.
+        """
+
+        ax, ay = apex
+
+        found = []
+        for d, x, y, item in self._entries_within(apex, max_dist, side):
+            # items right on the apex are always in the cone
+            if d == 0:
+                found.append((d, item))
+                continue
+
+            angle = math.degrees(math.atan2(y - ay, x - ax))
+
+            # smallest difference between the two angles, in [0, 180]
+            diff = abs((angle - direction + 180) % 360 - 180)
+            if diff <= half_angle:
+                found.append((d, item))
+
+        found.sort(key=lambda f: f[0])
+        return found
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+import array
+import multiprocessing
+import os
+import struct
+import sys
+
+import handler
+import match_recorder
+import sp_exceptions
+from world_model import WorldModel
+
+# the code each play mode is exported as.  any other play mode is exported as
+# UNKNOWN_PLAY_MODE.
+PLAY_MODES = (
+    WorldModel.PlayModes.BEFORE_KICK_OFF,
+    WorldModel.PlayModes.PLAY_ON,
+    WorldModel.PlayModes.TIME_OVER,
+    WorldModel.PlayModes.KICK_OFF_L,
+    WorldModel.PlayModes.KICK_OFF_R,
+    WorldModel.PlayModes.KICK_IN_L,
+    WorldModel.PlayModes.KICK_IN_R,
+    WorldModel.PlayModes.FREE_KICK_L,
+    WorldModel.PlayModes.FREE_KICK_R,
+    WorldModel.PlayModes.CORNER_KICK_L,
+    WorldModel.PlayModes.CORNER_KICK_R,
+    WorldModel.PlayModes.GOAL_KICK_L,
+    WorldModel.PlayModes.GOAL_KICK_R,
+    WorldModel.PlayModes.DROP_BALL,
+    WorldModel.PlayModes.OFFSIDE_L,
+    WorldModel.PlayModes.OFFSIDE_R,
+)
+PLAY_MODE_CODES = dict((mode, code) for code, mode in enumerate(PLAY_MODES))
+UNKNOWN_PLAY_MODE = -1
+
+# the name, array typecode, and width of every exported column.  unknown
+# floating point values are exported as NaN.
+COLUMNS = (
+    ("cycle", "i", 1),
+    ("abs_coords", "d", 2),
+    ("abs_body_dir", "d", 1),
+    ("abs_neck_dir", "d", 1),
+    ("ball_relative", "d", 2),
+    ("ball_absolute", "d", 2),
+    ("stamina", "d", 1),
+    ("play_mode", "i", 1),
+    ("score", "i", 2),
+)
+
+NAN = float("nan")
+
+def _or_nan(value):
+    """
+    Returns the given value, or NaN if it's None.
+    """
+
+    if value is None:
+        return NAN
+
+    return value
+
+def state_row(wm):
+    """
+    Returns the values of every column for the current state of a world model,
+    as a tuple of tuples in the order of COLUMNS.
+    """
+
+    # an unknown position is stored as (None, None)
+    abs_coords = wm.abs_coords
+    if abs_coords is None or abs_coords[0] is None:
+        abs_coords = (NAN, NAN)
+
+    ball_relative = (NAN, NAN)
+    if wm.ball is not None:
+        ball_relative = (_or_nan(wm.ball.distance),
+                         _or_nan(wm.ball.direction))
+
+    ball_absolute = (NAN, NAN)
+    ball_state = wm.get_ball_state()
+    if ball_state is not None:
+        ball_absolute = ball_state[0]
+
+    play_mode = PLAY_MODE_CODES.get(wm.play_mode, UNKNOWN_PLAY_MODE)
+
+    return ((wm.sim_time,), abs_coords, (_or_nan(wm.abs_body_dir),),
+            (_or_nan(wm.abs_neck_dir),), ball_relative, ball_absolute,
+            (_or_nan(wm.stamina),), (play_mode,), (wm.score_l, wm.score_r))
+
+def extract_states(messages, teamname=None):
+    """
+    Runs a sequence of received server messages through a MessageHandler and
+    WorldModel, and returns a dict of the arrays of every column by name,
+    with a row for the state at the end of each cycle.  Our team name isn't
+    in a log, so it must be given to tell teammates from opponents.
+    """
+
+    # nothing is ever sent, so the action handler doesn't need a socket
+    wm = WorldModel(handler.ActionHandler(None))
+    wm.teamname = teamname
+    msg_handler = handler.MessageHandler(wm)
+
+    columns = [array.array(typecode) for name, typecode, width in COLUMNS]
+
+    def add_row():
+        for column, values in zip(columns, state_row(wm)):
+            column.extend(values)
+
+    for message in messages:
+        # each 'sense_body' starts a new cycle, so the state we have is all
+        # we'll learn about the one before it.
+        cycle = match_recorder.message_cycle(message)
+        if (cycle is not None and wm.sim_time is not None and
+                cycle != wm.sim_time):
+            add_row()
+
+        try:
+            msg_handler.handle_message(message)
+        except sp_exceptions.SoccerServerError:
+            # errors only say a command was rejected, which doesn't affect
+            # what we know about the world.
+            pass
+
+    if wm.sim_time is not None:
+        add_row()
+
+    return dict((name, column) for (name, typecode, width), column in
+                zip(COLUMNS, columns))
+
+def write_npy(path, column, width):
+    """
+    Writes an array to a version 1.0 '.npy' file that numpy can load or
+    memory-map, as a one dimensional array if 'width' is 1 or a two
+    dimensional one with 'width' columns otherwise.
+    """
+
+    kind = "f" if column.typecode == "d" else "i"
+    descr = "<%s%d" % (kind, column.itemsize)
+
+    rows = len(column) // width
+    if width == 1:
+        shape = "(%d,)" % rows
+    else:
+        shape = "(%d, %d)" % (rows, width)
+
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': %s, }" % (
+            descr, shape)
+
+    # the magic string, version, and header length take ten bytes, and the
+    # header is padded with spaces so the data that follows it is aligned.
+    padding = 64 - (10 + len(header) + 1) % 64
+    if padding == 64:
+        padding = 0
+    header += " " * padding + "\n"
+
+    data = column
+    if sys.byteorder != "little":
+        data = array.array(column.typecode, column)
+        data.byteswap()
+
+    with open(path, "wb") as f:
+        f.write("\x93NUMPY\x01\x00")
+        f.write(struct.pack("<H", len(header)))
+        f.write(header)
+        f.write(data.tostring())
+
+def export_log(log_path, output_dir, teamname=None):
+    """
+    Exports the states in a log, which is a binary match_recorder log or a
+    text file of messages, to a '.npy' file per column in 'output_dir'.
+    Returns the number of rows exported.
+    """
+
+    messages = match_recorder.iter_log_messages(log_path)
+    columns = extract_states(messages, teamname)
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    for name, typecode, width in COLUMNS:
+        write_npy(os.path.join(output_dir, name + ".npy"), columns[name],
+                width)
+
+    return len(columns["cycle"])
+
+def _export_job(job):
+    """
+    Exports a single log in a worker process, returning its path along with
+    the number of rows exported and None, or None and the error that stopped
+    it.  Errors are returned rather than raised so one bad log doesn't stop
+    the rest.
+    """
+
+    log_path, output_dir, teamname = job
+    try:
+        return (log_path, export_log(log_path, output_dir, teamname), None)
+    except Exception, e:
+        return (log_path, None, "%s: %s" % (type(e).__name__, e))
+
+def export_logs(log_paths, output_dir, teamname=None, processes=None):
+    """
+    Exports many logs at once across a pool of processes, each into its own
+    directory under 'output_dir' named after the log and its position in
+    'log_paths'.  Yields the path of each log as it finishes, along with the
+    number of rows exported and the error that stopped it, if any.
+    """
+
+    # logs from different directories can share a name, so each directory is
+    # numbered by the log's position in the list too.
+    jobs = []
+    for i, log_path in enumerate(log_paths):
+        name = os.path.splitext(os.path.basename(log_path))[0]
+        name = "%d_%s" % (i, name)
+        jobs.append((log_path, os.path.join(output_dir, name), teamname))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_export_job, jobs):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the state of the "
+            "world at the end of every cycle of recorded matches to '.npy' "
+            "columns.")
+    parser.add_argument("logs", nargs="+", help="match_recorder logs or text "
+            "files of server messages (eg. client_recv)")
+    parser.add_argument("--output", default="states",
+            help="directory to write a directory of columns per log to")
+    parser.add_argument("--team", default=None,
+            help="name of the recording agent's team")
+    parser.add_argument("--processes", type=int, default=None,
+            help="how many logs to export at once, one per cpu by default")
+    options = parser.parse_args()
+
+    failed = 0
+    for log_path, rows, error in export_logs(options.logs, options.output,
+            options.team, options.processes):
+        if error is not None:
+            failed += 1
+            print "%s: failed, %s" % (log_path, error)
+        else:
+            print "%s: %d cycles" % (log_path, rows)
+
+    if failed > 0:
+        sys.exit(1)
@@ -0,0 +1,126 @@
+import itertools
+import threading
+import time
+
+import match_recorder
+
+# the most precise clock we have that never goes backwards
+now = getattr(time, "monotonic", time.time)
+
+# the events we trace, which match the directions of a match_recorder log
+RECEIVED = match_recorder.RECEIVED
+SENT = match_recorder.SENT
+
+class TraceBuffer:
+    """
+    A fixed-size ring buffer of the most recent messages received from and
+    sent to the server, for finding out what led up to a problem.  Recording
+    only stores a timestamp and a reference to the message, with no
+    formatting or copying, so it's cheap enough to leave on during matches.
+    The oldest entries are overwritten once the buffer is full.
+
+    Entries can be recorded from any thread.  Dumps are written as
+    match_recorder logs, so they can be read with match_recorder.MatchLog and
+    replayed like any other recording.
+    """
+
+    # the numbers of slots that hold no entry
+    EMPTY = -1
+    WRITING = -2
+
+    def __init__(self, capacity=4096, path=None):
+        """
+        capacity: how many of the most recent entries to keep.
+        path: where to dump the buffer to when no other path is given.
+        """
+
+        self.capacity = capacity
+        self.path = path
+
+        # entries are stored across parallel lists, allocated once up front
+        self.times = [0.0] * capacity
+        self.events = [None] * capacity
+        self.refs = [None] * capacity
+
+        # the number of the entry in each slot, counting from 0 since the
+        # buffer was created.  it's WRITING while the slot is being written,
+        # and EMPTY if nothing has been.
+        self.numbers = [TraceBuffer.EMPTY] * capacity
+
+        # hands out the number, and so the slot, of each entry.  taking from a
+        # counter is atomic, so threads recording at once never get the same
+        # one.
+        self.counter = itertools.count()
+
+    def record(self, event, ref):
+        """
+        Records an event along with the message it's about.
+        """
+
+        n = next(self.counter)
+        i = n % self.capacity
+
+        # the slot is marked while it's written, so readers never take its
+        # fields from two different entries.
+        self.numbers[i] = TraceBuffer.WRITING
+        self.times[i] = now()
+        self.events[i] = event
+        self.refs[i] = ref
+        self.numbers[i] = n
+
+    def entries(self):
+        """
+        Returns a list of the (timestamp, event, ref) tuples in the buffer,
+        oldest first.  Entries being written or overwritten while they're read
+        are left out.
+        """
+
+        numbered = []
+        for i in xrange(self.capacity):
+            n = self.numbers[i]
+            if n < 0:
+                continue
+
+            entry = (self.times[i], self.events[i], self.refs[i])
+
+            # the slot was written again while we read it
+            if self.numbers[i] != n:
+                continue
+
+            numbered.append((n, entry))
+
+        numbered.sort()
+        return [entry for n, entry in numbered]
+
+    def dump(self, path=None):
+        """
+        Writes everything in the buffer to a log at the given path, or the
+        buffer's own path if none is given.
+        """
+
+        self._write(path or self.path, self.entries())
+
+    def dump_async(self, path=None):
+        """
+        Takes a copy of the buffer and writes it out on a separate thread, so
+        the caller doesn't wait on the disk.  The thread keeps the process
+        alive until it's done.  Returns the thread.
+        """
+
+        t = threading.Thread(target=self._write,
+                args=(path or self.path, self.entries()), name="trace_dump")
+        t.start()
+
+        return t
+
+    def _write(self, path, entries):
+        """
+        Writes a list of entries to a log at the given path.
+        """
+
+        recorder = match_recorder.MatchRecorder(path)
+        try:
+            for timestamp, event, ref in entries:
+                recorder.record(event, ref, timestamp)
+        finally:
+            recorder.close()
@@ -0,0 +1,83 @@
+import collections
+
+# everything we knew about the world at the end of a particular server cycle.
+# 'derived' holds whatever lazily derived values (like 'abs_coords') had been
+# calculated for that cycle's perception update by the time it was recorded, or
+# later on during the same update.  the player index is reused from cycle to
+# cycle, so it's only meaningful in the latest snapshot.
+WorldSnapshot = collections.namedtuple("WorldSnapshot",
+        "cycle ball flags goals players lines neck_direction stamina effort "
+        "speed_amount speed_direction play_mode score_l score_r derived")
+
+class WorldHistory:
+    """
+    A fixed-capacity ring buffer of world snapshots indexed by server cycle.
+    Slots are allocated once up front and each cycle always maps to the same
+    slot, so recording and looking up a snapshot are both constant time and
+    memory use stays bounded for the length of a match.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        capacity: how many consecutive cycles of history to keep.
+        """
+
+        self.capacity = capacity
+        self.slots = [None] * capacity
+
+        # the most recent cycle recorded, or None if nothing has been
+        self.latest_cycle = None
+
+    def record(self, snapshot):
+        """
+        Stores a snapshot, replacing any earlier one for the same cycle along
+        with whatever was stored 'capacity' cycles before it.
+        """
+
+        # time going backwards means a new match (or a confused server), so
+        # everything we have is now meaningless.
+        if self.latest_cycle is not None and snapshot.cycle < self.latest_cycle:
+            self.clear()
+
+        self.slots[snapshot.cycle % self.capacity] = snapshot
+        self.latest_cycle = snapshot.cycle
+
+    def at_cycle(self, cycle):
+        """
+        Returns the snapshot recorded for the given cycle, or None if it was
+        never recorded or has since been overwritten.
+        """
+
+        snapshot = self.slots[cycle % self.capacity]
+        if snapshot is not None and snapshot.cycle == cycle:
+            return snapshot
+
+        return None
+
+    def ago(self, cycles):
+        """
+        Returns the snapshot from the given number of cycles before the latest
+        one, or None if we don't have it.
+        """
+
+        if self.latest_cycle is None or cycles < 0 or cycles >= self.capacity:
+            return None
+
+        return self.at_cycle(self.latest_cycle - cycles)
+
+    def latest(self):
+        """
+        Returns the most recently recorded snapshot, or None.
+        """
+
+        return self.ago(0)
+
+    def clear(self):
+        """
+        Forgets all recorded snapshots.
+        """
+
+        for i in xrange(self.capacity):
+            self.slots[i] = None
+
+        self.latest_cycle = None
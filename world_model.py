@@ -1,11 +1,21 @@
+import collections
 import math
 import random
 
 import message_parser
 import sp_exceptions
 import game_object
-
-class WorldModel:
+import spatial_index
+import ball_model
+import kick_model
+import pass_evaluator
+import world_history
+import object_tracker
+import landmarks
+import say_codec
+import player_types
+
+class WorldModel(object):
     """
     Holds and updates the model of the world as known from current and past
     data.
@@ -15,6 +25,18 @@ class WorldModel:
     SIDE_L = "l"
     SIDE_R = "r"
 
+    # how many cycles into the future we look for ball interceptions
+    INTERCEPT_HORIZON = 50
+
+    # how many past cycles of world state we remember
+    HISTORY_SIZE = 64
+
+    # how many cycles a teammate's report of itself or the ball stays useful
+    BALL_REPORT_MAX_AGE = 10
+
+    # when and where somebody can first reach the ball
+    Intercept = collections.namedtuple("Intercept", "cycle point")
+
     class PlayModes:
         """
         Acts as a static class containing variables for all valid play modes.
@@ -100,6 +122,18 @@ class WorldModel:
         # stores the most recent message heard
         self.last_message = None
 
+        # the latest report of the ball heard from a teammate
+        self.ball_report = None
+
+        # the blackboard shared with teammates on the same host, if any
+        self.blackboard = None
+
+        # the server's simulation cycle as of the last message that reported it
+        self.sim_time = None
+
+        # the cycle of the last fullstate message, if the server sends them
+        self.fullstate_time = None
+
         # the mode the game is currently in (default to not playing yet)
         self.play_mode = WorldModel.PlayModes.BEFORE_KICK_OFF
 
@@ -122,58 +156,207 @@ class WorldModel:
         self.move_count = None
         self.change_view_count = None
 
-        # apparent absolute player coordinates and neck/body directions
-        self.abs_coords = (None, None)
-        self.abs_neck_dir = None
-        self.abs_body_dir = None
+        # values derived from the most recent perception update, like apparent
+        # absolute player coordinates and neck/body directions.  these are only
+        # computed when first asked for, then cached until new information
+        # arrives, so cycles that never read them don't pay for them.
+        self._derived = {
+            "abs_coords": (None, None),
+            "abs_neck_dir": None,
+            "abs_body_dir": None
+        }
+
+        # how many derived value lookups were served from the cache, and how
+        # many had to be computed.
+        self.derived_hits = 0
+        self.derived_misses = 0
+
+        # spatial index of all currently placed players, reused every cycle
+        self._player_index = spatial_index.SpatialGrid()
+
+        # follows the ball and players across perception updates to estimate
+        # how they're moving.
+        self.tracker = object_tracker.ObjectTracker()
+
+        # snapshots of the world as it was in recent cycles
+        self.history = world_history.WorldHistory(WorldModel.HISTORY_SIZE)
 
         # create a new server parameter object for holding all server params
         self.server_parameters = ServerParameters()
 
-    def triangulate_direction(self, flags, flag_dict):
+        # commands are clamped to the limits the server gives us
+        self.ah.encoder.server_parameters = self.server_parameters
+
+        # every player type, with constants derived from the server parameters
+        self.player_types = player_types.PlayerTypeTable(self.server_parameters,
+                WorldModel.INTERCEPT_HORIZON)
+
+        # the type id of every player known to have changed type, keyed by
+        # (side, uniform number).  ids of opponents are None, since the server
+        # doesn't tell us which type they changed to.
+        self.player_type_ids = {}
+
+        # the coordinates of every flag and goal on the field
+        self.landmarks = landmarks.LandmarkTable(
+                self.server_parameters.goal_width)
+
+    def _get_derived(self, key, compute):
+        """
+        Returns the derived value stored under 'key' for the current perception
+        update, calling 'compute' to calculate and cache it on first access.
+        """
+
+        derived = self._derived
+        if key in derived:
+            self.derived_hits += 1
+            return derived[key]
+
+        self.derived_misses += 1
+        value = compute()
+        derived[key] = value
+
+        return value
+
+    @property
+    def abs_coords(self):
+        """
+        The apparent absolute coordinates of the player, triangulated from the
+        currently visible flags.
+        """
+
+        return self._get_derived("abs_coords", self._compute_abs_coords)
+
+    @abs_coords.setter
+    def abs_coords(self, value):
+        self._derived["abs_coords"] = value
+
+    @property
+    def abs_neck_dir(self):
+        """
+        The apparent absolute direction of the player's neck, or None if it
+        couldn't be determined.
+        """
+
+        return self._get_derived("abs_neck_dir", self._compute_abs_neck_dir)
+
+    @abs_neck_dir.setter
+    def abs_neck_dir(self, value):
+        self._derived["abs_neck_dir"] = value
+
+    @property
+    def abs_body_dir(self):
+        """
+        The apparent absolute direction of the player's body, or None if it
+        couldn't be determined.
+        """
+
+        return self._get_derived("abs_body_dir", self._compute_abs_body_dir)
+
+    @abs_body_dir.setter
+    def abs_body_dir(self, value):
+        self._derived["abs_body_dir"] = value
+
+    def _compute_abs_coords(self):
+        """
+        Calculates the apparent coordinates of the player based on all flags.
+        """
+
+        # TODO: make all triangulate_* calculations more accurate
+        return self.triangulate_position(self.flags, self.landmarks)
+
+    def _compute_abs_neck_dir(self):
+        """
+        Calculates the absolute neck direction based on flag directions.
+        """
+
+        return self.triangulate_direction(self.flags, self.landmarks)
+
+    def _compute_abs_body_dir(self):
+        """
+        Calculates the absolute body direction, which we can only know if we
+        got a neck direction.
+        """
+
+        # the neck angle is relative to the body and increases clockwise, while
+        # absolute directions increase counter-clockwise.
+        abs_neck_dir = self.abs_neck_dir
+        if abs_neck_dir is not None and self.neck_direction is not None:
+            return (abs_neck_dir + self.neck_direction) % 360
+
+        return None
+
+    def triangulate_direction(self, flags, landmarks):
         """
         Determines absolute view angle for the player given a list of visible
-        flags.  We find the absolute angle to each flag, then return the average
-        of those angles.  Returns 'None' if no angle could be determined.
+        flags and the landmark table they index into.  We find the absolute
+        angle to each flag, correct it by the flag's direction relative to our
+        neck, then return the average of those angles.  Returns 'None' if no
+        angle could be determined.
         """
 
-        # average all flag angles together and save that as absolute angle
-        abs_angles = []
-        for f in self.flags:
+        x, y = self.abs_coords
+        if x is None:
+            return None
+
+        xs = landmarks.xs
+        ys = landmarks.ys
+
+        # average all flag angles together as unit vectors, so angles on either
+        # side of 0 degrees don't cancel out.
+        total_x = 0.0
+        total_y = 0.0
+        for f in flags:
             # if the flag has useful data, consider it
-            if f.distance is not None and f.flag_id in flag_dict:
-                flag_point = flag_dict[f.flag_id]
-                abs_dir = self.angle_between_points(self.abs_coords, flag_point)
-                abs_angles.append(abs_dir)
+            if f.direction is None or f.flag_id is None:
+                continue
+
+            # directions increase clockwise relative to the neck, but
+            # counter-clockwise in absolute terms.
+            i = f.flag_id
+            abs_dir = math.atan2(ys[i] - y, xs[i] - x)
+            neck_dir = abs_dir + math.radians(f.direction)
+
+            total_x += math.cos(neck_dir)
+            total_y += math.sin(neck_dir)
 
         # return the average if available
-        if len(abs_angles) > 0:
-            return sum(abs_angles) / len(abs_angles)
+        if total_x == 0 and total_y == 0:
+            return None
 
-        return None
+        a = math.degrees(math.atan2(total_y, total_x))
+        if a < 0:
+            a = 360 + a
+
+        return a
 
-    def triangulate_position(self, flags, flag_dict, angle_step=36):
+    def triangulate_position(self, flags, landmarks, angle_step=36):
         """
         Returns a best-guess position based on the triangulation via distances
-        to all flags in the flag list given.  'angle_step' specifies the
-        increments between angles for projecting points onto the circle
-        surrounding a flag.
+        to all flags in the flag list given, which index into the given
+        landmark table.  'angle_step' specifies the increments between angles
+        for projecting points onto the circle surrounding a flag.
         """
 
+        xs = landmarks.xs
+        ys = landmarks.ys
+
+        # the unit circle offsets we project every flag's distance along
+        offsets = [(math.cos(math.radians(i)), math.sin(math.radians(i)))
+                   for i in xrange(0, 360, angle_step)]
+
         points = []
         for f in flags:
             # skip flags without distance information or without a specific id
-            if f.distance is None or f.flag_id not in flag_dict:
+            if f.distance is None or f.flag_id is None:
                 continue
 
+            fx = xs[f.flag_id]
+            fy = ys[f.flag_id]
+
             # generate points every 'angle_step' degrees around each flag,
             # discarding those off-field.
-            for i in xrange(0, 360, angle_step):
-                dy = f.distance * math.sin(math.radians(i))
-                dx = f.distance * math.cos(math.radians(i))
-
-                fcoords = flag_dict[f.flag_id]
-                new_point = (fcoords[0] + dx, fcoords[1] + dy)
+            for cos_i, sin_i in offsets:
+                new_point = (fx + f.distance * cos_i, fy + f.distance * sin_i)
 
                 # skip points with a coordinate outside the play boundaries
                 if (new_point[0] > 60 or new_point[0] < -60 or
@@ -294,13 +477,24 @@ class WorldModel:
 
         return a
 
-    def process_new_info(self, ball, flags, goals, players, lines):
+    def process_new_info(self, ball, flags, goals, players, lines,
+            sim_time=None):
         """
         Update any internal variables based on the currently available
         information.  This also calculates information not available directly
         from server-reported messages, such as player coordinates.
         """
 
+        # if the previous update was placed but nobody asked for velocities,
+        # it still belongs in the tracks.  updates nobody placed are left out
+        # rather than triangulated just for the tracker.
+        derived = self._derived
+        if "object_coords" in derived and "tracks" not in derived:
+            self._add_to_tracks(derived["object_coords"])
+
+        if sim_time is not None:
+            self.sim_time = sim_time
+
         # update basic information
         self.ball = ball
         self.flags = flags
@@ -308,20 +502,169 @@ class WorldModel:
         self.players = players
         self.lines = lines
 
-        # TODO: make all triangulate_* calculations more accurate
+        # throw away everything derived from the previous update.  the apparent
+        # coordinates and directions of the player are recalculated from the
+        # new flags the first time somebody asks for them.
+        self._derived = {}
 
-        # update the apparent coordinates of the player based on all flag pairs
-        flag_dict = game_object.Flag.FLAG_COORDS
-        self.abs_coords = self.triangulate_position(self.flags, flag_dict)
+        self.record_snapshot()
 
-        # set the neck and body absolute directions based on flag directions
-        self.abs_neck_dir = self.triangulate_direction(self.flags, flag_dict)
+    def process_ball_report(self, report):
+        """
+        Stores a say_codec.BallReport heard from a teammate, unless we already
+        have a more recent one.  It's used from the next perception update on.
+        """
 
-        # set body dir only if we got a neck dir, else reset it
-        if self.abs_neck_dir is not None and self.neck_direction is not None:
-            self.abs_body_dir = self.abs_neck_dir - self.neck_direction
-        else:
-            self.abs_body_dir = None
+        if self.ball_report is None or report.cycle >= self.ball_report.cycle:
+            self.ball_report = report
+
+    def process_fullstate(self, sim_time, ball, players):
+        """
+        Replaces the world state with the exact information from a fullstate
+        message, so none of it has to be estimated.  'ball' is an (x, y, vx, vy)
+        tuple or None, and 'players' a list of (side, uniform_number, x, y, vx,
+        vy, body_dir, neck_dir) tuples for every player on the field.  Absolute
+        coordinates and directions must already be converted to ours, and neck
+        directions relative to the body, as the server reports them.
+
+        Game objects are created for the ball and every other player, with
+        distances and directions relative to us as if we could see them.
+        """
+
+        self.sim_time = sim_time
+        self.fullstate_time = sim_time
+
+        # find ourselves, since everything else is placed relative to us
+        me = None
+        for p in players:
+            if p[0] == self.side and p[1] == self.uniform_number:
+                me = p
+                break
+
+        derived = {
+            "abs_coords": (None, None),
+            "abs_neck_dir": None,
+            "abs_body_dir": None
+        }
+
+        if me is not None:
+            side, unum, x, y, vx, vy, body_dir, neck_dir = me
+
+            self.neck_direction = neck_dir
+            self.speed_amount = math.sqrt(vx ** 2 + vy ** 2)
+
+            derived["abs_coords"] = (x, y)
+            derived["abs_body_dir"] = body_dir % 360
+            derived["abs_neck_dir"] = (body_dir - neck_dir) % 360
+
+        my_coords = derived["abs_coords"]
+        abs_neck_dir = derived["abs_neck_dir"]
+
+        def relative(x, y):
+            # distance and neck-relative direction to a point, if we know where
+            # we are ourselves.
+            if me is None:
+                return (None, None)
+
+            distance = self.euclidean_distance(my_coords, (x, y))
+            direction = self.normalize_angle(abs_neck_dir -
+                    self.angle_between_points(my_coords, (x, y)))
+
+            return (distance, direction)
+
+        coords = {}
+
+        new_ball = None
+        if ball is not None:
+            x, y, vx, vy = ball
+            distance, direction = relative(x, y)
+
+            new_ball = game_object.Ball(distance, direction, None, None,
+                    math.sqrt(vx ** 2 + vy ** 2))
+            new_ball.velocity = (vx, vy)
+            new_ball.heading = object_tracker.heading((vx, vy))
+
+            coords[id(new_ball)] = (x, y)
+            derived["ball_state"] = ((x, y), (vx, vy))
+
+        new_players = []
+        for p in players:
+            if p is me:
+                continue
+
+            side, unum, x, y, vx, vy, body_dir, neck_dir = p
+            distance, direction = relative(x, y)
+
+            # fullstate doesn't name the other team
+            teamname = None
+            if side == self.side:
+                teamname = self.teamname
+
+            # body and neck directions of seen players are relative to our neck
+            rel_body_dir = None
+            rel_neck_dir = None
+            if me is not None:
+                rel_body_dir = self.normalize_angle(abs_neck_dir - body_dir)
+                rel_neck_dir = self.normalize_angle(rel_body_dir + neck_dir)
+
+            player = game_object.Player(distance, direction, None, None,
+                    math.sqrt(vx ** 2 + vy ** 2), teamname, side, unum,
+                    rel_body_dir, rel_neck_dir)
+            player.velocity = (vx, vy)
+            player.heading = object_tracker.heading((vx, vy))
+
+            coords[id(player)] = (x, y)
+            new_players.append(player)
+
+        derived["object_coords"] = coords
+
+        # the server told us exactly how everything is moving
+        derived["tracks"] = []
+
+        self.ball = new_ball
+        self.flags = []
+        self.goals = []
+        self.players = new_players
+        self.lines = []
+
+        # everything derived is already known exactly, so nothing needs to be
+        # triangulated this cycle.
+        self._derived = derived
+
+        self.record_snapshot()
+
+    def record_snapshot(self):
+        """
+        Saves the current state of the world in the history under the current
+        server cycle, replacing anything saved earlier in the same cycle.
+        """
+
+        if self.sim_time is None:
+            return
+
+        self.history.record(world_history.WorldSnapshot(self.sim_time,
+            self.ball, self.flags, self.goals, self.players, self.lines,
+            self.neck_direction, self.stamina, self.effort, self.speed_amount,
+            self.speed_direction, self.play_mode, self.score_l, self.score_r,
+            self._derived))
+
+    def get_snapshot(self, cycles_ago=0):
+        """
+        Returns the world snapshot from some number of cycles ago, or None if
+        it isn't in the history.
+        """
+
+        return self.history.ago(cycles_ago)
+
+    def update_landmarks(self):
+        """
+        Rebuilds the landmark table if the server parameters it's derived from
+        have changed.
+        """
+
+        goal_width = self.server_parameters.goal_width
+        if goal_width != self.landmarks.goal_width:
+            self.landmarks = landmarks.LandmarkTable(goal_width)
 
     def is_before_kick_off(self):
         """
@@ -374,10 +717,10 @@ class WorldModel:
         Tells us whether the ball is in reach of the current player.
         """
 
-        # ball must be visible, not behind us, and within the kickable margin
+        # ball must be visible and within our type's kickable area
         return (self.ball is not None and
                 self.ball.distance is not None and
-                self.ball.distance <= self.server_parameters.kickable_margin)
+                self.ball.distance <= self.get_player_type().kickable_area)
 
     def get_ball_speed_max(self):
         """
@@ -386,44 +729,147 @@ class WorldModel:
 
         return self.server_parameters.ball_speed_max
 
+    def get_player_type(self, player=None):
+        """
+        Returns the PlayerType of the given game_object.Player, or our own if
+        no player is given.  Players we don't know the type of are assumed to
+        be of the default type.
+        """
+
+        if player is None:
+            key = (self.side, self.uniform_number)
+        else:
+            key = (player.side, player.uniform_number)
+
+        type_id = self.player_type_ids.get(key, player_types.DEFAULT_TYPE)
+
+        return self.player_types.get(type_id)
+
+    def update_player_types(self):
+        """
+        Rederives the constants of every player type from the current server
+        parameters.  Call whenever they change.
+        """
+
+        self.player_types.update()
+
+    def get_kick_model(self):
+        """
+        Returns the kick lookup tables for our player type and the current
+        server parameters.
+        """
+
+        return self.get_player_type().kick_model
+
+    def get_ball_kick_position(self, ball):
+        """
+        Returns the (edge distance, body-relative direction) of a ball for use
+        with the kick model, or None if the ball isn't placed relative to us.
+        """
+
+        if (ball is None or ball.distance is None or
+                ball.direction is None or self.neck_direction is None):
+            return None
+
+        dist = max(ball.distance - self.get_player_type().player_size -
+                   self.server_parameters.ball_size, 0.0)
+        direction = self.normalize_angle(ball.direction + self.neck_direction)
+
+        return (dist, direction)
+
     def kick_to(self, point, extra_power=0.0):
         """
         Kick the ball to some point with some extra-power factor added on.
         extra_power=0.0 means the ball should stop at the given point, anything
-        higher means it should have proportionately more speed.
+        higher means it should have proportionately more speed.  Returns False
+        if we don't know enough about ourselves and the ball to kick.
         """
 
-        # how far are we from the desired point?
-        point_dist = self.euclidean_distance(self.abs_coords, point)
+        state = self.get_ball_state()
+        kick_pos = self.get_ball_kick_position(self.ball)
+        if state is None or kick_pos is None or self.abs_body_dir is None:
+            return False
 
-        # get absolute direction to the point
-        abs_point_dir = self.angle_between_points(self.abs_coords, point)
+        ball_pos, ball_vel = state
+        km = self.get_kick_model()
+
+        # the velocity the ball should leave with to get to the point
+        dist = self.euclidean_distance(ball_pos, point)
+        speed = km.speed_for_distance(dist, extra_power)
+        abs_point_dir = math.radians(self.angle_between_points(ball_pos, point))
+        target_vel = (speed * math.cos(abs_point_dir),
+                      speed * math.sin(abs_point_dir))
 
-        # get relative direction to point from body, since kicks are relative to
-        # body direction.
-        if self.abs_body_dir is not None:
-            rel_point_dir = self.abs_body_dir - abs_point_dir
-
-        # we do a simple linear interpolation to calculate final kick speed,
-        # assuming a kick of power 100 goes 45 units in the given direction.
-        # these numbers were obtained from section 4.5.3 of the documentation.
-        # TODO: this will fail if parameters change, needs to be more flexible
-        max_kick_dist = 45.0
-        dist_ratio = point_dist / max_kick_dist
-
-        # find the required power given ideal conditions, then add scale up by
-        # difference bewteen actual aceivable power and maxpower.
-        required_power = dist_ratio * self.server_parameters.maxpower
-        effective_power = self.get_effective_kick_power(self.ball,
-                required_power)
-        required_power += 1 - (effective_power / required_power)
-
-        # add more power!
-        power_mod = 1.0 + extra_power
-        power = required_power * power_mod
+        # the kick has to make up the difference from the ball's current motion
+        accel = (target_vel[0] - ball_vel[0], target_vel[1] - ball_vel[1])
+        accel_amount = math.sqrt(accel[0] ** 2 + accel[1] ** 2)
+        abs_accel_dir = math.degrees(math.atan2(accel[1], accel[0]))
+
+        # kicks are relative to body direction
+        rel_dir = self.normalize_angle(self.abs_body_dir - abs_accel_dir)
+        power = km.power_for_accel(kick_pos[0], kick_pos[1], accel_amount)
 
         # do the kick, finally
-        self.ah.kick(rel_point_dir, power)
+        self.ah.kick(power, rel_dir)
+
+        return True
+
+    def evaluate_passes(self, targets, extra_power=0.0):
+        """
+        Scores kicking the ball to each of the given targets, which may be
+        (x, y) points or visible players, and returns a list of
+        pass_evaluator.PassOptions sorted best first.  Targets we can't place
+        are left out, and nothing is returned if we can't place ourselves and
+        the ball.
+        """
+
+        state = self.get_ball_state()
+        kick_pos = self.get_ball_kick_position(self.ball)
+        if state is None or kick_pos is None:
+            return []
+
+        coords = self.get_visible_object_coords()
+
+        # turn players into the points they're standing on
+        points = []
+        receivers = []
+        for target in targets:
+            if isinstance(target, game_object.Player):
+                point = coords.get(id(target))
+                if point is None:
+                    continue
+
+                points.append(point)
+                receivers.append(target)
+            else:
+                points.append(target)
+                receivers.append(None)
+
+        # opponents of the same type share a reach table, so they're grouped
+        # by type, those we don't know the type of being of the default one.
+        opponent_side = self.get_opponent_side()
+        by_type = {}
+        for p in self.players:
+            if p.side == opponent_side and id(p) in coords:
+                player_type = self.get_player_type(p)
+                group = by_type.get(player_type.id)
+                if group is None:
+                    group = ([], player_type.reach_table,
+                             player_type.kickable_margin)
+                    by_type[player_type.id] = group
+                group[0].append(coords[id(p)])
+
+        return pass_evaluator.evaluate_passes(state[0], points, receivers,
+                by_type.values(), self.get_kick_model(), kick_pos,
+                extra_power, horizon=WorldModel.INTERCEPT_HORIZON)
+
+    def get_visible_teammates(self):
+        """
+        Returns a list of all visible players known to be on our team.
+        """
+
+        return [p for p in self.players
+                if p.side is not None and p.side == self.side]
 
     def get_effective_kick_power(self, ball, power):
         """
@@ -431,24 +877,17 @@ class WorldModel:
         4.21 in the documentation for more details.
         """
 
-        # we can't calculate if we don't have a distance to the ball
-        if ball.distance is None:
+        # we can't calculate if we don't know where the ball is
+        kick_pos = self.get_ball_kick_position(ball)
+        if kick_pos is None:
             return
 
-        # first we get effective kick power:
         # limit kick_power to be between minpower and maxpower
         kick_power = max(min(power, self.server_parameters.maxpower),
                 self.server_parameters.minpower)
 
-        # scale it by the kick_power rate
-        kick_power *= self.server_parameters.kick_power_rate
-
-        # now we calculate the real effective power...
-        a = 0.25 * (ball.direction / 180)
-        b = 0.25 * (ball.distance / self.server_parameters.kickable_margin)
-
-        # ...and then return it
-        return 1 - a - b
+        # scale it by how well placed the ball is for kicking
+        return kick_power * self.get_kick_model().kick_factor(*kick_pos)
 
     def turn_neck_to_object(self, obj):
         """
@@ -465,6 +904,13 @@ class WorldModel:
 
         return self.euclidean_distance(self.abs_coords, point)
 
+    def normalize_angle(self, angle):
+        """
+        Returns the given angle in degrees converted to the range [-180, 180).
+        """
+
+        return (angle + 180) % 360 - 180
+
     def turn_body_to_point(self, point):
         """
         Turns the agent's body to face a given point on the field.
@@ -474,11 +920,37 @@ class WorldModel:
         abs_point_dir = self.angle_between_points(self.abs_coords, point)
 
         # subtract from absolute body direction to get relative angle
-        relative_dir = self.abs_body_dir - abs_point_dir
+        relative_dir = self.normalize_angle(self.abs_body_dir - abs_point_dir)
 
         # turn to that angle
         self.ah.turn(relative_dir)
 
+    def dash_to_point(self, point, power):
+        """
+        Runs towards a point on the field, turning to face it first if we're
+        not already headed close enough to it to arrive within kicking
+        distance.  Returns False if we don't know enough about our own position
+        and facing to do so.
+        """
+
+        if self.abs_coords[0] is None or self.abs_body_dir is None:
+            return False
+
+        abs_point_dir = self.angle_between_points(self.abs_coords, point)
+        relative_dir = self.normalize_angle(self.abs_body_dir - abs_point_dir)
+
+        # the further away the point is, the more precisely we need to face it
+        dist = self.get_distance_to_point(point)
+        margin = self.get_player_type().kickable_margin
+        tolerance = math.degrees(math.atan2(margin, max(dist, margin)))
+
+        if abs(relative_dir) > tolerance:
+            self.ah.turn(relative_dir)
+        else:
+            self.ah.dash(power)
+
+        return True
+
     def get_object_absolute_coords(self, obj):
         """
         Determines the absolute coordinates of the given object based on the
@@ -490,12 +962,128 @@ class WorldModel:
         if obj.distance is None:
             return None
 
-        # get the components of the vector to the object
-        dx = obj.distance * math.cos(obj.direction)
-        dy = obj.distance * math.sin(obj.direction)
+        # objects from the current perception update are looked up in the
+        # per-cycle cache, which calculates all their positions at once.
+        coords = self.get_visible_object_coords()
+        if id(obj) in coords:
+            return coords[id(obj)]
+
+        # anything else (ie. an object kept from an earlier update) gets its
+        # position calculated on its own.
+        return self._compute_object_coords([obj]).get(id(obj))
+
+    def get_visible_object_coords(self):
+        """
+        Returns a dict mapping the ids of all currently visible objects with a
+        distance to their absolute coordinates.  This is calculated once per
+        perception update and shared by all spatial queries.
+        """
+
+        return self._get_derived("object_coords", self._compute_visible_coords)
+
+    def _compute_visible_coords(self):
+        """
+        Calculates absolute coordinates for the ball, players, and goals from
+        the latest perception update.
+        """
+
+        objects = list(self.players)
+        objects.extend(self.goals)
+        if self.ball is not None:
+            objects.append(self.ball)
+
+        return self._compute_object_coords(objects)
+
+    def update_tracks(self):
+        """
+        Adds the mobile objects of the latest perception update to their
+        tracks, then fills in the speed, velocity, and heading of every one of
+        them that has enough history to estimate it.  Done at most once per
+        update, and only when asked for, since it needs our position.
+        """
+
+        self._get_derived("tracks", self._compute_tracks)
+
+    def _compute_tracks(self):
+        """
+        Tracks the objects of the latest perception update and estimates their
+        velocities, returning the list of (key, object) pairs that were
+        tracked.
+        """
+
+        tracked = self._add_to_tracks(self.get_visible_object_coords())
+        velocities = self.tracker.estimate_velocities(
+                [k for k, obj in tracked])
+
+        for key, obj in tracked:
+            velocity = velocities.get(key)
+            if velocity is not None:
+                obj.velocity = velocity
+                obj.speed = math.sqrt(velocity[0] ** 2 + velocity[1] ** 2)
+                obj.heading = object_tracker.heading(velocity)
+
+        return tracked
 
-        # return the point the object is at relative to our current position
-        return (self.abs_coords[0] + dx, self.abs_coords[1] + dy)
+    def _add_to_tracks(self, coords):
+        """
+        Adds the mobile objects of the latest perception update that were
+        placed in 'coords' to their tracks, returning the list of (key,
+        object) pairs that were added.
+        """
+
+        if self.sim_time is None:
+            return []
+
+        mobile = list(self.players)
+        if self.ball is not None:
+            mobile.append(self.ball)
+
+        tracker = self.tracker
+        observations = []
+        tracked = []
+        for obj in mobile:
+            key = tracker.key_for(obj)
+            if key is not None and id(obj) in coords:
+                observations.append((key, coords[id(obj)]))
+                tracked.append((key, obj))
+
+        tracker.update(self.sim_time, observations)
+
+        return tracked
+
+    def _compute_object_coords(self, objects):
+        """
+        Calculates the absolute coordinates of all the given objects in one go,
+        returning a dict mapping object ids to coordinates.  Objects without a
+        distance, or whose coordinates can't be known because we don't know
+        our own position and facing, are left out.
+        """
+
+        coords = {}
+
+        x, y = self.abs_coords
+        abs_neck_dir = self.abs_neck_dir
+        if x is None or abs_neck_dir is None:
+            return coords
+
+        # local names for the trig functions, since this is a tight loop
+        cos = math.cos
+        sin = math.sin
+        radians = math.radians
+
+        for obj in objects:
+            distance = obj.distance
+            if distance is None:
+                continue
+
+            # visible object directions are relative to our neck and increase
+            # clockwise, while absolute directions increase counter-clockwise.
+            abs_dir = radians(abs_neck_dir - obj.direction)
+
+            coords[id(obj)] = (x + distance * cos(abs_dir),
+                               y + distance * sin(abs_dir))
+
+        return coords
 
     def teleport_to_point(self, point):
         """
@@ -514,26 +1102,383 @@ class WorldModel:
         if self.neck_direction is not None:
             self.ah.turn_neck(self.neck_direction * -1)
 
+    def get_opponent_side(self):
+        """
+        Returns the side the other team is playing on, or None if we don't know
+        our own side yet.
+        """
+
+        if self.side == WorldModel.SIDE_L:
+            return WorldModel.SIDE_R
+        elif self.side == WorldModel.SIDE_R:
+            return WorldModel.SIDE_L
+
+        return None
+
+    def get_player_index(self):
+        """
+        Returns a spatial index of all currently visible players whose absolute
+        coordinates are known.  The index is built once per perception update
+        and answers nearest-neighbour, radius, and cone queries.
+        """
+
+        return self._get_derived("player_index", self._build_player_index)
+
+    def _build_player_index(self):
+        """
+        Fills the reusable player index with the players from the latest
+        perception update.
+        """
+
+        index = self._player_index
+        index.clear()
+
+        coords = self.get_visible_object_coords()
+        for p in self.players:
+            p_coords = coords.get(id(p))
+            if p_coords is not None:
+                index.insert(p, p_coords, p.side)
+
+        return index
+
     def get_nearest_teammate_to_point(self, point):
         """
         Returns the uniform number of the fastest teammate to some point.
         """
 
-        # holds tuples of (player dist to point, player)
-        distances = []
-        for p in self.players:
-            # skip enemy and unknwon players
-            if p.side != self.side:
-                continue
+        # return the nearest known teammate to the given point, if any
+        nearest = self.get_player_index().nearest(point, 1, self.side)
+        if len(nearest) == 0:
+            return None
+
+        return nearest[0][1]
+
+    def get_nearest_opponent_to_point(self, point):
+        """
+        Returns the nearest known opponent to some point, or None if we can't
+        place any.
+        """
+
+        nearest = self.get_player_index().nearest(point, 1,
+                self.get_opponent_side())
+        if len(nearest) == 0:
+            return None
+
+        return nearest[0][1]
+
+    def get_nearest_players_to_point(self, point, k, side=None):
+        """
+        Returns a list of (distance, player) tuples for the 'k' known players
+        nearest to some point, nearest first, optionally restricted to one side.
+        """
+
+        return self.get_player_index().nearest(point, k, side)
+
+    def get_players_in_radius(self, point, radius, side=None):
+        """
+        Returns a list of (distance, player) tuples for all known players within
+        some radius of a point, nearest first, optionally restricted to one
+        side.
+        """
+
+        return self.get_player_index().within_radius(point, radius, side)
+
+    def get_players_in_cone(self, apex, direction, half_angle, max_dist,
+            side=None):
+        """
+        Returns a list of (distance, player) tuples for all known players inside
+        a cone starting at 'apex' and pointing in the absolute 'direction',
+        nearest first.  Useful for checking pass lanes and marking.
+        """
+
+        return self.get_player_index().within_cone(apex, direction, half_angle,
+                max_dist, side)
+
+    def get_self_velocity(self):
+        """
+        Returns our own absolute (vx, vy) velocity as reported by the server,
+        or (0, 0) if we don't know it.
+        """
+
+        abs_neck_dir = self.abs_neck_dir
+        if (self.speed_amount is None or self.speed_direction is None or
+                abs_neck_dir is None):
+            return (0.0, 0.0)
+
+        abs_dir = math.radians(abs_neck_dir - self.speed_direction)
+        return (self.speed_amount * math.cos(abs_dir),
+                self.speed_amount * math.sin(abs_dir))
+
+    def get_ball_state(self):
+        """
+        Returns the ball's absolute ((x, y), (vx, vy)) position and velocity as
+        of the latest perception update, or None if we can't place the ball.
+        A ball whose velocity can't be estimated is assumed to be still.
+        """
+
+        return self._get_derived("ball_state", self._compute_ball_state)
+
+    def _compute_ball_state(self):
+        """
+        Uses where we see the ball if we can place it, and what teammates
+        reported about it otherwise.
+        """
+
+        state = self.get_seen_ball_state()
+        if state is None:
+            return self.get_reported_ball_state()
+
+        return state
+
+    def get_seen_ball_state(self):
+        """
+        Like get_ball_state, but only ever from what we've seen ourselves, so
+        it's None whenever we can't place the ball without help.
+        """
+
+        return self._get_derived("seen_ball_state",
+                self._compute_seen_ball_state)
+
+    def _compute_seen_ball_state(self):
+        """
+        Places the ball and estimates its velocity, preferring the server's
+        deltas when the ball is close enough to have them and falling back on
+        its track otherwise.
+        """
+
+        ball = self.ball
+        if ball is None or ball.distance is None:
+            return None
+
+        position = self.get_object_absolute_coords(ball)
+        if position is None:
+            return None
+
+        if ball.dist_change is not None and ball.dir_change is not None:
+            velocity = ball_model.velocity_from_changes(ball.distance,
+                    ball.direction, ball.dist_change, ball.dir_change,
+                    self.abs_neck_dir, self.get_self_velocity())
+        else:
+            self.update_tracks()
+            velocity = ball.velocity
+            if velocity is None:
+                velocity = (0.0, 0.0)
+
+        return (position, velocity)
+
+    def get_reported_ball_state(self):
+        """
+        Returns the ball's absolute ((x, y), (vx, vy)) position and velocity as
+        of the current cycle, predicted from the most recent report of it we
+        have from a teammate, whether heard or read from the blackboard.
+        Returns None if we don't have a recent one.
+        """
+
+        if self.sim_time is None:
+            return None
+
+        # (cycle, position, velocity) of the freshest report
+        latest = None
+
+        report = self.ball_report
+        if report is not None:
+            latest = (report.cycle, report.ball_position, report.ball_velocity)
+
+        for entry in self.get_teammate_states():
+            if (entry.ball_position is not None and
+                    (latest is None or entry.ball_cycle > latest[0])):
+                latest = (entry.ball_cycle, entry.ball_position,
+                          entry.ball_velocity)
+
+        if latest is None:
+            return None
+
+        cycle, position, velocity = latest
+
+        age = self.sim_time - cycle
+        if not 0 <= age <= WorldModel.BALL_REPORT_MAX_AGE:
+            return None
 
-            # find their absolute position
-            p_coords = self.get_object_absolute_coords(p)
+        decay = self.server_parameters.ball_decay
+        position = ball_model.predict_position(position, velocity, age, decay)
+        velocity = (velocity[0] * decay ** age, velocity[1] * decay ** age)
 
-            distances.append((self.euclidean_distance(point, p_coords), p))
+        return (position, velocity)
 
-        # return the nearest known teammate to the given point
-        nearest = min(distances)[1]
-        return nearest
+    def publish_to_blackboard(self):
+        """
+        Writes where we are and where we see the ball to our slot on the team's
+        blackboard, if we have one.  Only what we've seen ourselves is
+        published, never what teammates told us.  Returns whether we could
+        place ourselves and published anything.
+        """
+
+        if (self.blackboard is None or self.sim_time is None or
+                self.uniform_number is None or self.abs_coords[0] is None):
+            return False
+
+        self.blackboard.publish(self.uniform_number - 1, self.sim_time,
+                self.abs_coords, self.get_seen_ball_state())
+
+        return True
+
+    def get_teammate_states(self):
+        """
+        Returns a list of blackboard.BlackboardEntry objects with what every
+        teammate recently published to the team's blackboard about itself and
+        the ball, or an empty list if we don't have a blackboard.
+        """
+
+        if self.blackboard is None or self.sim_time is None:
+            return []
+
+        oldest = self.sim_time - WorldModel.BALL_REPORT_MAX_AGE
+
+        exclude = None
+        if self.uniform_number is not None:
+            exclude = self.uniform_number - 1
+
+        return [e for e in self.blackboard.read_all(exclude)
+                if e.cycle >= oldest]
+
+    def say_ball_state(self):
+        """
+        Tells our teammates where we see the ball and where we are, so those
+        that can't see it don't need to look for it.  Returns whether there was
+        anything to say, ie. whether we can place both ourselves and the ball.
+        """
+
+        if self.sim_time is None:
+            return False
+
+        state = self.get_seen_ball_state()
+        if state is None or self.abs_coords[0] is None:
+            return False
+
+        self.ah.say(say_codec.encode_ball(self.sim_time, state[0], state[1],
+            self.abs_coords))
+
+        return True
+
+    def get_ball_velocity(self):
+        """
+        Returns the ball's estimated absolute (vx, vy) velocity, or None if we
+        can't place the ball.
+        """
+
+        state = self.get_ball_state()
+        if state is None:
+            return None
+
+        return state[1]
+
+    def predict_ball_position(self, cycles):
+        """
+        Returns where we expect the ball to be some number of cycles from the
+        latest perception update, or None if we can't place the ball.
+        """
+
+        state = self.get_ball_state()
+        if state is None:
+            return None
+
+        position, velocity = state
+        return ball_model.predict_position(position, velocity, cycles,
+                self.server_parameters.ball_decay)
+
+    def get_reach_table(self, player_type=None):
+        """
+        Returns the table of the furthest distances a player of the given type,
+        or our own, can run in each number of cycles up to the intercept
+        horizon.  Acceleration is limited by both player_accel_max and the
+        acceleration of a full power dash.
+        """
+
+        if player_type is None:
+            player_type = self.get_player_type()
+
+        return player_type.reach_table
+
+    def get_ball_intercept(self):
+        """
+        Returns an Intercept with the earliest cycle and point at which we can
+        reach the ball, or None if we can't reach it within the intercept
+        horizon or don't know where it or we are.
+        """
+
+        return self._get_derived("intercepts", self._compute_intercepts)[0]
+
+    def get_player_intercepts(self):
+        """
+        Returns a list of (player, Intercept) tuples for every visible player we
+        can place, with an Intercept of None for those that can't reach the
+        ball within the intercept horizon.
+        """
+
+        return self._get_derived("intercepts", self._compute_intercepts)[1]
+
+    def _compute_intercepts(self):
+        """
+        Predicts the ball's path once, then finds when we and every visible
+        player can first reach it in a single pass along that path.
+        """
+
+        state = self.get_ball_state()
+        if state is None:
+            return (None, [])
+
+        position, velocity = state
+        sp = self.server_parameters
+        trajectory = ball_model.predict_trajectory(position, velocity,
+                sp.ball_decay, WorldModel.INTERCEPT_HORIZON,
+                sp.derived("ball_travel"))
+
+        # we're the first candidate, if we know where we are
+        candidates = []
+        owners = []
+        types = []
+        if self.abs_coords[0] is not None:
+            candidates.append(self.abs_coords)
+            owners.append(None)
+            types.append(self.get_player_type())
+
+        coords = self.get_visible_object_coords()
+        for p in self.players:
+            p_coords = coords.get(id(p))
+            if p_coords is not None:
+                candidates.append(p_coords)
+                owners.append(p)
+                types.append(self.get_player_type(p))
+
+        # candidates of the same type share a reach table, so they're solved
+        # together.
+        by_type = {}
+        for i, player_type in enumerate(types):
+            by_type.setdefault(player_type.id, []).append(i)
+
+        cycles = [None] * len(candidates)
+        for indexes in by_type.itervalues():
+            player_type = types[indexes[0]]
+            solved = ball_model.solve_intercepts(trajectory,
+                    [candidates[i] for i in indexes], player_type.reach_table,
+                    player_type.kickable_margin)
+
+            for i, cycle in zip(indexes, solved):
+                cycles[i] = cycle
+
+        own = None
+        players = []
+        for owner, cycle in zip(owners, cycles):
+            intercept = None
+            if cycle is not None:
+                intercept = WorldModel.Intercept(cycle, trajectory[cycle])
+
+            if owner is None:
+                own = intercept
+            else:
+                players.append((owner, intercept))
+
+        return (own, players)
 
     def get_stamina(self):
         """
@@ -556,180 +1501,327 @@ class WorldModel:
 
         self.ah.turn(obj.direction)
 
-class ServerParameters:
+class ServerParameters(object):
     """
-    A storage container for all the settings of the soccer server.
+    A storage container for all the settings of the soccer server.  Parameters
+    are stored in slots, and a whole 'server_param' message is loaded in a
+    single call to load.  Parameters we don't know about are kept in the
+    'extras' dict rather than rejected, so newer servers still work.
+
+    Constants derived from the parameters are cached by derived, and dropped
+    from the cache whenever a parameter they depend on changes.
     """
 
+    # the name and default value of every parameter we know about
+    DEFAULTS = (
+        ("audio_cut_dist", 50),
+        ("auto_mode", 0),
+        ("back_passes", 1),
+        ("ball_accel_max", 2.7),
+        ("ball_decay", 0.94),
+        ("ball_rand", 0.05),
+        ("ball_size", 0.085),
+        ("ball_speed_max", 2.7),
+        ("ball_stuck_area", 3),
+        ("ball_weight", 0.2),
+        ("catch_ban_cycle", 5),
+        ("catch_probability", 1),
+        ("catchable_area_l", 2),
+        ("catchable_area_w", 1),
+        ("ckick_margin", 1),
+        ("clang_advice_win", 1),
+        ("clang_define_win", 1),
+        ("clang_del_win", 1),
+        ("clang_info_win", 1),
+        ("clang_mess_delay", 50),
+        ("clang_mess_per_cycle", 1),
+        ("clang_meta_win", 1),
+        ("clang_rule_win", 1),
+        ("clang_win_size", 300),
+        ("coach", 0),
+        ("coach_port", 6001),
+        ("coach_w_referee", 0),
+        ("connect_wait", 300),
+        ("control_radius", 2),
+        ("dash_power_rate", 0.006),
+        ("drop_ball_time", 200),
+        ("effort_dec", 0.005),
+        ("effort_dec_thr", 0.3),
+        ("effort_inc", 0.01),
+        ("effort_inc_thr", 0.6),
+        ("effort_init", 1),
+        ("effort_min", 0.6),
+        ("forbid_kick_off_offside", 1),
+        ("free_kick_faults", 1),
+        ("freeform_send_period", 20),
+        ("freeform_wait_period", 600),
+        ("fullstate_l", 0),
+        ("fullstate_r", 0),
+        ("game_log_compression", 0),
+        ("game_log_dated", 1),
+        ("game_log_dir", "./"),
+        ("game_log_fixed", 0),
+        ("game_log_fixed_name", "rcssserver"),
+        ("game_log_version", 3),
+        ("game_logging", 1),
+        ("game_over_wait", 100),
+        ("goal_width", 14.02),
+        ("goalie_max_moves", 2),
+        ("half_time", 300),
+        ("hear_decay", 1),
+        ("hear_inc", 1),
+        ("hear_max", 1),
+        ("inertia_moment", 5),
+        ("keepaway", 0),
+        ("keepaway_length", 20),
+        ("keepaway_log_dated", 1),
+        ("keepaway_log_dir", "./"),
+        ("keepaway_log_fixed", 0),
+        ("keepaway_log_fixed_name", "rcssserver"),
+        ("keepaway_logging", 1),
+        ("keepaway_start", -1),
+        ("keepaway_width", 20),
+        ("kick_off_wait", 100),
+        ("kick_power_rate", 0.027),
+        ("kick_rand", 0),
+        ("kick_rand_factor_l", 1),
+        ("kick_rand_factor_r", 1),
+        ("kickable_margin", 0.7),
+        ("landmark_file", "~/.rcssserver-landmark.xml"),
+        ("log_date_format", "%Y%m%d%H%M-"),
+        ("log_times", 0),
+        ("max_goal_kicks", 3),
+        ("maxmoment", 180),
+        ("maxneckang", 90),
+        ("maxneckmoment", 180),
+        ("maxpower", 100),
+        ("minmoment", -180),
+        ("minneckang", -90),
+        ("minneckmoment", -180),
+        ("minpower", -100),
+        ("nr_extra_halfs", 2),
+        ("nr_normal_halfs", 2),
+        ("offside_active_area_size", 2.5),
+        ("offside_kick_margin", 9.15),
+        ("olcoach_port", 6002),
+        ("old_coach_hear", 0),
+        ("pen_allow_mult_kicks", 1),
+        ("pen_before_setup_wait", 30),
+        ("pen_coach_moves_players", 1),
+        ("pen_dist_x", 42.5),
+        ("pen_max_extra_kicks", 10),
+        ("pen_max_goalie_dist_x", 14),
+        ("pen_nr_kicks", 5),
+        ("pen_random_winner", 0),
+        ("pen_ready_wait", 50),
+        ("pen_setup_wait", 100),
+        ("pen_taken_wait", 200),
+        ("penalty_shoot_outs", 1),
+        ("player_accel_max", 1),
+        ("player_decay", 0.4),
+        ("player_rand", 0.1),
+        ("player_size", 0.3),
+        ("player_speed_max", 1.2),
+        ("player_weight", 60),
+        ("point_to_ban", 5),
+        ("point_to_duration", 20),
+        ("port", 6000),
+        ("prand_factor_l", 1),
+        ("prand_factor_r", 1),
+        ("profile", 0),
+        ("proper_goal_kicks", 0),
+        ("quantize_step", 0.1),
+        ("quantize_step_l", 0.01),
+        ("record_messages", 0),
+        ("recover_dec", 0.002),
+        ("recover_dec_thr", 0.3),
+        ("recover_init", 1),
+        ("recover_min", 0.5),
+        ("recv_step", 10),
+        ("say_coach_cnt_max", 128),
+        ("say_coach_msg_size", 128),
+        ("say_msg_size", 10),
+        ("send_comms", 0),
+        ("send_step", 150),
+        ("send_vi_step", 100),
+        ("sense_body_step", 100),
+        ("simulator_step", 100),
+        ("slow_down_factor", 1),
+        ("slowness_on_top_for_left_team", 1),
+        ("slowness_on_top_for_right_team", 1),
+        ("stamina_inc_max", 45),
+        ("stamina_max", 4000),
+        ("start_goal_l", 0),
+        ("start_goal_r", 0),
+        ("stopped_ball_vel", 0.01),
+        ("synch_micro_sleep", 1),
+        ("synch_mode", 0),
+        ("synch_offset", 60),
+        ("tackle_back_dist", 0.5),
+        ("tackle_cycles", 10),
+        ("tackle_dist", 2),
+        ("tackle_exponent", 6),
+        ("tackle_power_rate", 0.027),
+        ("tackle_width", 1),
+        ("team_actuator_noise", 0),
+        ("text_log_compression", 0),
+        ("text_log_dated", 1),
+        ("text_log_dir", "./"),
+        ("text_log_fixed", 0),
+        ("text_log_fixed_name", "rcssserver"),
+        ("text_logging", 1),
+        ("use_offside", 1),
+        ("verbose", 0),
+        ("visible_angle", 90),
+        ("visible_distance", 3),
+        ("wind_ang", 0),
+        ("wind_dir", 0),
+        ("wind_force", 0),
+        ("wind_none", 0),
+        ("wind_rand", 0),
+        ("wind_random", 0),
+    )
+
+    # the names of every parameter we know about
+    NAMES = frozenset(name for name, value in DEFAULTS)
+
+    __slots__ = tuple(name for name, value in DEFAULTS) + ("extras",
+            "_derived")
+
     def __init__(self):
         """
         Initialize default parameters for a server.
         """
 
-        self.audio_cut_dist = 50
-        self.auto_mode = 0
-        self.back_passes = 1
-        self.ball_accel_max = 2.7
-        self.ball_decay = 0.94
-        self.ball_rand = 0.05
-        self.ball_size = 0.085
-        self.ball_speed_max = 2.7
-        self.ball_stuck_area = 3
-        self.ball_weight = 0.2
-        self.catch_ban_cycle = 5
-        self.catch_probability = 1
-        self.catchable_area_l = 2
-        self.catchable_area_w = 1
-        self.ckick_margin = 1
-        self.clang_advice_win = 1
-        self.clang_define_win = 1
-        self.clang_del_win = 1
-        self.clang_info_win = 1
-        self.clang_mess_delay = 50
-        self.clang_mess_per_cycle = 1
-        self.clang_meta_win = 1
-        self.clang_rule_win = 1
-        self.clang_win_size = 300
-        self.coach = 0
-        self.coach_port = 6001
-        self.coach_w_referee = 0
-        self.connect_wait = 300
-        self.control_radius = 2
-        self.dash_power_rate =0.006
-        self.drop_ball_time = 200
-        self.effort_dec = 0.005
-        self.effort_dec_thr = 0.3
-        self.effort_inc = 0.01
-        self.effort_inc_thr = 0.6
-        self.effort_init = 1
-        self.effort_min = 0.6
-        self.forbid_kick_off_offside = 1
-        self.free_kick_faults = 1
-        self.freeform_send_period = 20
-        self.freeform_wait_period = 600
-        self.fullstate_l = 0
-        self.fullstate_r = 0
-        self.game_log_compression = 0
-        self.game_log_dated = 1
-        self.game_log_dir = './'
-        self.game_log_fixed = 0
-        self.game_log_fixed_name = 'rcssserver'
-        self.game_log_version = 3
-        self.game_logging = 1
-        self.game_over_wait = 100
-        self.goal_width = 14.02
-        self.goalie_max_moves = 2
-        self.half_time = 300
-        self.hear_decay = 1
-        self.hear_inc = 1
-        self.hear_max = 1
-        self.inertia_moment = 5
-        self.keepaway = 0
-        self.keepaway_length = 20
-        self.keepaway_log_dated = 1
-        self.keepaway_log_dir = './'
-        self.keepaway_log_fixed = 0
-        self.keepaway_log_fixed_name = 'rcssserver'
-        self.keepaway_logging = 1
-        self.keepaway_start = -1
-        self.keepaway_width = 20
-        self.kick_off_wait = 100
-        self.kick_power_rate = 0.027
-        self.kick_rand = 0
-        self.kick_rand_factor_l = 1
-        self.kick_rand_factor_r = 1
-        self.kickable_margin = 0.7
-        self.landmark_file = '~/.rcssserver-landmark.xml'
-        self.log_date_format = '%Y%m%d%H%M-'
-        self.log_times = 0
-        self.max_goal_kicks = 3
-        self.maxmoment = 180
-        self.maxneckang = 90
-        self.maxneckmoment = 180
-        self.maxpower = 100
-        self.minmoment = -180
-        self.minneckang = -90
-        self.minneckmoment = -180
-        self.minpower = -100
-        self.nr_extra_halfs = 2
-        self.nr_normal_halfs = 2
-        self.offside_active_area_size = 2.5
-        self.offside_kick_margin = 9.15
-        self.olcoach_port = 6002
-        self.old_coach_hear = 0
-        self.pen_allow_mult_kicks = 1
-        self.pen_before_setup_wait = 30
-        self.pen_coach_moves_players = 1
-        self.pen_dist_x = 42.5
-        self.pen_max_extra_kicks = 10
-        self.pen_max_goalie_dist_x = 14
-        self.pen_nr_kicks = 5
-        self.pen_random_winner = 0
-        self.pen_ready_wait = 50
-        self.pen_setup_wait = 100
-        self.pen_taken_wait = 200
-        self.penalty_shoot_outs = 1
-        self.player_accel_max = 1
-        self.player_decay = 0.4
-        self.player_rand = 0.1
-        self.player_size = 0.3
-        self.player_speed_max = 1.2
-        self.player_weight = 60
-        self.point_to_ban = 5
-        self.point_to_duration = 20
-        self.port = 6000
-        self.prand_factor_l = 1
-        self.prand_factor_r = 1
-        self.profile = 0
-        self.proper_goal_kicks = 0
-        self.quantize_step = 0.1
-        self.quantize_step_l = 0.01
-        self.record_messages = 0
-        self.recover_dec = 0.002
-        self.recover_dec_thr = 0.3
-        self.recover_init = 1
-        self.recover_min = 0.5
-        self.recv_step = 10
-        self.say_coach_cnt_max = 128
-        self.say_coach_msg_size = 128
-        self.say_msg_size = 10
-        self.send_comms = 0
-        self.send_step = 150
-        self.send_vi_step = 100
-        self.sense_body_step = 100
-        self.simulator_step = 100
-        self.slow_down_factor = 1
-        self.slowness_on_top_for_left_team = 1
-        self.slowness_on_top_for_right_team = 1
-        self.stamina_inc_max = 45
-        self.stamina_max = 4000
-        self.start_goal_l = 0
-        self.start_goal_r = 0
-        self.stopped_ball_vel = 0.01
-        self.synch_micro_sleep = 1
-        self.synch_mode = 0
-        self.synch_offset = 60
-        self.tackle_back_dist = 0.5
-        self.tackle_cycles = 10
-        self.tackle_dist = 2
-        self.tackle_exponent = 6
-        self.tackle_power_rate = 0.027
-        self.tackle_width = 1
-        self.team_actuator_noise = 0
-        self.text_log_compression = 0
-        self.text_log_dated = 1
-        self.text_log_dir = './'
-        self.text_log_fixed = 0
-        self.text_log_fixed_name = 'rcssserver'
-        self.text_logging = 1
-        self.use_offside = 1
-        self.verbose = 0
-        self.visible_angle = 90
-        self.visible_distance = 3
-        self.wind_ang = 0
-        self.wind_dir = 0
-        self.wind_force = 0
-        self.wind_none = 0
-        self.wind_rand = 0
-        self.wind_random = 0
+        # derived constants, by name
+        object.__setattr__(self, "_derived", {})
+
+        # parameters sent by the server that we don't know about, by name
+        self.extras = {}
+
+        for name, value in ServerParameters.DEFAULTS:
+            setattr(self, name, value)
+
+    def __setattr__(self, name, value):
+        """
+        Sets a parameter, dropping any cached constants derived from it if its
+        value changed.
+        """
+
+        changed = getattr(self, name, None) != value
+        object.__setattr__(self, name, value)
+
+        if changed:
+            for derived_name in _DEPENDENTS.get(name, ()):
+                self._derived.pop(derived_name, None)
+
+    def load(self, pairs):
+        """
+        Sets every parameter in a sequence of (name, value) pairs, as found in
+        a parsed 'server_param' message.  Unknown parameters are stored in
+        'extras'.  Returns a list of the names of any unknown parameters.
+        """
+
+        names = ServerParameters.NAMES
+
+        unknown = []
+        for name, value in pairs:
+            if name in names:
+                setattr(self, name, value)
+            else:
+                self.extras[name] = value
+                unknown.append(name)
+
+        return unknown
+
+    def derived(self, name):
+        """
+        Returns the derived constant with the given name from _DERIVED,
+        computing it only if a parameter it depends on has changed since it was
+        last asked for.
+        """
+
+        derived = self._derived
+        if name in derived:
+            return derived[name]
+
+        value = _DERIVED[name][1](self)
+        derived[name] = value
+
+        return value
+
+# how many cycles ahead the cached ball travel distances go, which covers
+# every prediction we make.
+BALL_TRAVEL_HORIZON = 100
+
+def _max_kick_distance(sp):
+    """
+    How far a still ball goes after the strongest possible kick.
+    """
+
+    return kick_model.max_kick_speed(sp, 1.0) * sp.derived("ball_travel_limit")
+
+def _ball_travel(sp):
+    """
+    How far a ball goes in each number of cycles up to the horizon, per unit of
+    its initial speed.
+    """
+
+    return ball_model.ball_travel(sp.ball_decay, BALL_TRAVEL_HORIZON)
+
+def _ball_travel_limit(sp):
+    """
+    How far a ball goes before it stops, per unit of its initial speed.
+    """
+
+    return 1.0 / (1 - sp.ball_decay)
+
+def _kick_models(sp):
+    """
+    An empty dict to hold the KickModel for each kickable margin, so player
+    types sharing a margin share its tables.
+    """
+
+    return {}
+
+def _stamina_recovery_max(sp):
+    """
+    How much stamina a rested player recovers each cycle.
+    """
+
+    return sp.stamina_inc_max * sp.recover_init
+
+def _stamina_recovery_min(sp):
+    """
+    How much stamina a worn out player recovers each cycle.
+    """
+
+    return sp.stamina_inc_max * sp.recover_min
+
+# the parameters each derived constant depends on, and how to compute it
+_DERIVED = {
+    "max_kick_distance": (kick_model.PARAMETERS, _max_kick_distance),
+    "ball_travel": (("ball_decay",), _ball_travel),
+    "ball_travel_limit": (("ball_decay",), _ball_travel_limit),
+    "kick_models": (kick_model.PARAMETERS, _kick_models),
+    "stamina_recovery_max": (("stamina_inc_max", "recover_init"),
+                             _stamina_recovery_max),
+    "stamina_recovery_min": (("stamina_inc_max", "recover_min"),
+                             _stamina_recovery_min),
+}
+
+def _find_dependents():
+    """
+    Returns a dict mapping each parameter to the names of the derived
+    constants that depend on it.
+    """
+
+    dependents = {}
+    for name, (depends_on, compute) in _DERIVED.iteritems():
+        for param in depends_on:
+            dependents.setdefault(param, []).append(name)
+
+    return dependents
 
+# the derived constants depending on each parameter
+_DEPENDENTS = _find_dependents()